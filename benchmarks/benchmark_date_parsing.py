@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+"""
+Compare the time taken to parse common date formats with the DateAnnotator's
+simple date parser and with dateparser.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import datetime
+import timeit
+from dateparser.date import DateDataParser
+from epitator.date_annotator import parse_simple_date
+
+DATE_STRINGS = [
+    '2019-03-12', '12/03/2019', '13/03/2019', '12 March 2019',
+    '5 Sept 2018', 'March 2019', 'Dec 1999', '2019', '1850']
+
+if __name__ == '__main__':
+    parser = DateDataParser(['en'], settings={
+        'RELATIVE_BASE': datetime.datetime(2019, 4, 1),
+        'PREFER_DATES_FROM': 'past'})
+    number = 200
+    for name, parse in [
+            ('parse_simple_date', parse_simple_date),
+            ('dateparser', parser.get_date_data)]:
+        seconds = timeit.timeit(
+            lambda: [parse(text) for text in DATE_STRINGS], number=number)
+        print("%s: %.1f microseconds per date" % (
+            name, 1e6 * seconds / (number * len(DATE_STRINGS))))
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""
+Time find_maximum_weight_interval_set on sets of random overlapping
+intervals with numeric and tuple weights.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import random
+import timeit
+from epitator.maximum_weight_interval_set import Interval, find_maximum_weight_interval_set
+
+
+def random_intervals(count, tuple_weights=False):
+    rand = random.Random(count)
+    intervals = []
+    for idx in range(count):
+        start = rand.randint(0, count * 5)
+        end = start + rand.choice([0, 1, 3, 5, 10, 20])
+        if tuple_weights:
+            weight = (rand.randint(1, 4), rand.randint(0, 1), -(end - start))
+        else:
+            weight = end - start
+        intervals.append(Interval(start, end, weight, idx))
+    return intervals
+
+
+if __name__ == '__main__':
+    for count in [100, 1000, 10000, 100000]:
+        for tuple_weights in [False, True]:
+            intervals = random_intervals(count, tuple_weights)
+            number = max(1, 100000 // count)
+            seconds = timeit.timeit(
+                lambda: find_maximum_weight_interval_set(intervals), number=number)
+            print("%d intervals, %s weights: %.2f milliseconds" % (
+                count, 'tuple' if tuple_weights else 'numeric',
+                1e3 * seconds / number))
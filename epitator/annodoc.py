@@ -4,9 +4,115 @@ from __future__ import absolute_import
 from __future__ import print_function
 from . import maximum_weight_interval_set as mwis
 import six
-import re
 from .annospan import AnnoSpan, SpanGroup
-from .annotier import AnnoTier
+from .annotier import AnnoTier, compile_regex
+
+# The maximum number of text slices an AnnoDoc keeps. They are discarded
+# when there are more.
+MAX_TEXT_SLICE_CACHE_SIZE = 100000
+
+# The tiers the SpacyAnnotator creates. They are left out when documents are
+# pickled or serialized, because the snapshots stored in place of spaCy
+# tokens and spans don't include the parse tree annotators read. They are
+# created again when an annotator requires them.
+SPACY_TIER_NAMES = ('spacy.sentences', 'spacy.noun_chunks', 'spacy.tokens', 'spacy.nes')
+
+
+def _common_prefix_length(a, b):
+    """
+    Binary search for the length of the common prefix so that the comparisons
+    are done on slices rather than character by character.
+    """
+    low = 0
+    high = min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def _common_suffix_length(a, b, limit):
+    low = 0
+    high = min(len(a), len(b), limit)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def _first_span_starting_at(spans, offset):
+    """
+    Return the index of the first span in a sorted span list that starts at
+    or after the offset.
+    """
+    low = 0
+    high = len(spans)
+    while low < high:
+        mid = (low + high) // 2
+        if spans[mid].start < offset:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def _expand_to_sentences(sentences, start, end, context_sentences=0):
+    """
+    Expand the range to the boundaries of the sentences it overlaps or
+    touches plus the given number of sentences on either side.
+    """
+    spans = sentences.spans
+    idx = _first_span_starting_at(spans, start)
+    # Step back over the sentences that contain the start offset.
+    before = idx
+    while before > 0 and spans[before - 1].end >= start:
+        before -= 1
+    before = max(0, before - context_sentences)
+    if before < len(spans):
+        start = min(start, spans[before].start)
+    after = _first_span_starting_at(spans, end)
+    # Include a sentence that begins right where the range ends.
+    if after < len(spans) and spans[after].start == end:
+        after += 1
+    after = min(len(spans), after + context_sentences)
+    for span in spans[before:after]:
+        end = max(end, span.end)
+    return start, end
+
+
+def _shift_spans(spans, offset, delta, visited):
+    """
+    Shift the spans starting at or after the offset by delta along with
+    the spans they are composed of or reference in their metadata.
+    """
+    stack = list(spans)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, AnnoSpan):
+            if id(value) in visited:
+                continue
+            visited.add(id(value))
+            # Some span types like MetaGroups derive their bounds from
+            # their base spans and store them until they are cleared.
+            if isinstance(type(value).start, property):
+                value.clear_cached_structure()
+            elif value.start >= offset:
+                value.start += delta
+                value.end += delta
+            stack.extend(value.base_spans)
+            if value.metadata:
+                stack.append(value.metadata)
+        elif isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
 
 
 class AnnoDoc(object):
@@ -23,17 +129,90 @@ class AnnoDoc(object):
             raise TypeError("text must be string or unicode")
         self.tiers = {}
         self.date = date
+        # The annotators used to create the document's tiers are recorded
+        # so they can be rerun when the text is edited.
+        self.annotation_history = []
+        # When a region is set, annotators that scan the document text only
+        # need to annotate the text between its start and end offsets.
+        self.region = None
+        self._replaying = False
+        # Document-level information annotators carry between the windows of
+        # a streamed document, like the latest date mentioned. It is only set
+        # on the windows annotate_stream creates, so annotating a document
+        # again doesn't reuse information from an earlier annotation.
+        self.context = None
+
+    def __getstate__(self):
+        # Annotators can hold database connections so the history is not
+        # pickled.
+        state = self.__dict__.copy()
+        state['annotation_history'] = []
+        state['tiers'] = {
+            name: tier for name, tier in self.tiers.items()
+            if name not in SPACY_TIER_NAMES}
+        state.pop('_text_slices', None)
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault('annotation_history', [])
+        state.setdefault('region', None)
+        state.setdefault('_replaying', False)
+        state.setdefault('context', None)
+        self.__dict__.update(state)
 
     def __len__(self):
         return len(self.text)
 
+    def text_slice(self, start, end):
+        """
+        Return the text between the offsets. The slices are kept so reading
+        the text of the same span again returns the same string instead of
+        copying it from the document. They are discarded if the document's
+        text is replaced.
+
+        >>> doc = AnnoDoc('one two')
+        >>> doc.text_slice(4, 7)
+        'two'
+        >>> doc.text_slice(4, 7) is doc.text_slice(4, 7)
+        True
+        >>> doc.text = 'six seven'
+        >>> doc.text_slice(4, 7)
+        'sev'
+        """
+        text = self.text
+        text_slices = self.__dict__.get('_text_slices')
+        if text_slices is None or text_slices[0] is not text or len(text_slices[1]) >= MAX_TEXT_SLICE_CACHE_SIZE:
+            text_slices = self._text_slices = (text, {})
+        key = (start, end)
+        result = text_slices[1].get(key)
+        if result is None:
+            result = text_slices[1][key] = text[start:end]
+        return result
+
     def add_tier(self, annotator, **kwargs):
         return self.add_tiers(annotator, **kwargs)
 
     def add_tiers(self, annotator, **kwargs):
+        if self._replaying:
+            result = annotator.annotate(self, **kwargs)
+            if isinstance(result, dict):
+                self.tiers.update(result)
+            return self
+        history_length = len(self.annotation_history)
+        previous_tiers = dict(self.tiers)
         result = annotator.annotate(self, **kwargs)
         if isinstance(result, dict):
             self.tiers.update(result)
+        # Tiers added by the annotators this one required are attributed to
+        # them rather than to this annotator.
+        nested_tier_names = set(
+            tier_name
+            for _, _, tier_names in self.annotation_history[history_length:]
+            for tier_name in tier_names)
+        self.annotation_history.append((annotator, kwargs, [
+            tier_name for tier_name, tier in self.tiers.items()
+            if previous_tiers.get(tier_name) is not tier and
+            tier_name not in nested_tier_names]))
         return self
 
     def require_tiers(self, *tier_names, **kwargs):
@@ -55,12 +234,196 @@ class AnnoDoc(object):
             else:
                 raise Exception("Tier could not be found. Available tiers: " + str(self.tiers.keys()))
 
+    def region_bounds(self):
+        """
+        Return the start and end offsets of the text annotators should scan.
+        """
+        if self.region:
+            return self.region
+        return 0, len(self.text)
+
+    def edit(self, start, end, replacement, context_sentences=1):
+        """
+        Replace the text between the start and end offsets and update the
+        tiers incrementally.
+
+        The spans that overlap the sentences touching the edit are removed
+        and the spans after them are shifted. Then the annotators in the
+        annotation history are rerun in order with the document's region set
+        to the sentences around the edit and the tiers limited to that window.
+        Each annotator's new spans that overlap the invalidated range replace
+        the old ones that do, and the invalidated range grows to cover both
+        so downstream annotators recompute the spans that depend on them.
+        The context_sentences parameter sets how many sentences beyond the
+        invalidated range annotators see.
+
+        Annotators that use document-wide context, like the document date
+        detection in the DateAnnotator, only see the window around the edit.
+        Similarly, spaCy's parses can differ slightly from a full annotation
+        because the sentences are grouped differently.
+        Shifting the spans is a single pass over them, while the annotation
+        work is proportional to the size of the edited sentences.
+
+        >>> from .annospan import AnnoSpan
+        >>> from .annotier import AnnoTier
+        >>> doc = AnnoDoc('one two three')
+        >>> doc.tiers = {
+        ...     'test': AnnoTier([AnnoSpan(0, 3, doc), AnnoSpan(8, 13, doc)])}
+        >>> doc.edit(4, 7, 'four').text
+        'one four three'
+        >>> doc.tiers['test']
+        AnnoTier([AnnoSpan(0-3, one), AnnoSpan(9-14, three)])
+        """
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError("Invalid edit range: " + str((start, end)))
+        delta = len(replacement) - (end - start)
+        sentences = self.tiers.get('spacy.sentences')
+        if sentences:
+            invalid_start, invalid_end = _expand_to_sentences(sentences, start, end)
+        else:
+            invalid_start, invalid_end = start, end
+
+        def shift_offset(offset):
+            if offset <= start:
+                return offset
+            elif offset >= end:
+                return offset + delta
+            return start + len(replacement)
+        tiers = {}
+        visited = set()
+        shifted_invalid_start = shift_offset(invalid_start)
+        shifted_invalid_end = shift_offset(invalid_end)
+        for tier_name, tier in self.tiers.items():
+            spans = []
+            for span in tier.spans:
+                if span.end <= invalid_start or span.start >= invalid_end:
+                    spans.append(span)
+                else:
+                    # The range is grown to cover the removed spans so they
+                    # are fully recomputed.
+                    shifted_invalid_start = min(
+                        shifted_invalid_start, shift_offset(span.start))
+                    shifted_invalid_end = max(
+                        shifted_invalid_end, shift_offset(span.end))
+            _shift_spans(spans, end, delta, visited)
+            tiers[tier_name] = AnnoTier(spans, presorted=True)
+        self.text = self.text[:start] + replacement + self.text[end:]
+        self.tiers = tiers
+        self._reannotate(
+            shifted_invalid_start, shifted_invalid_end, context_sentences)
+        return self
+
+    def update_text(self, text, context_sentences=1):
+        """
+        Replace the document text and incrementally update its tiers based on
+        the range of text that differs.
+
+        >>> doc = AnnoDoc('one two three')
+        >>> doc.update_text('one twenty three').text
+        'one twenty three'
+        """
+        if type(text) is str and type(text) is not six.text_type:
+            text = six.text_type(text, 'utf8')
+        prefix_length = _common_prefix_length(self.text, text)
+        suffix_length = _common_suffix_length(
+            self.text, text, min(len(self.text), len(text)) - prefix_length)
+        if prefix_length == len(self.text) == len(text):
+            return self
+        return self.edit(
+            prefix_length,
+            len(self.text) - suffix_length,
+            text[prefix_length:len(text) - suffix_length],
+            context_sentences=context_sentences)
+
+    def _reannotate(self, invalid_start, invalid_end, context_sentences):
+        tiers = self.tiers
+        pending_tier_names = set(
+            tier_name
+            for _, _, tier_names in self.annotation_history
+            for tier_name in tier_names)
+        self._replaying = True
+        try:
+            for annotator, kwargs, tier_names in self.annotation_history:
+                while True:
+                    window_start, window_end = self._annotate_window(
+                        annotator, kwargs, tiers, pending_tier_names,
+                        invalid_start, invalid_end, context_sentences)
+                    spliced_start, spliced_end = self._splice_tiers(
+                        tiers, tier_names, invalid_start, invalid_end)
+                    invalid_start, invalid_end = spliced_start, spliced_end
+                    # When removed spans extend past the text the annotator
+                    # saw it is rerun on a window that covers them.
+                    if window_start <= spliced_start and spliced_end <= window_end:
+                        break
+                pending_tier_names.difference_update(tier_names)
+        finally:
+            self._replaying = False
+            self.region = None
+            self.tiers = tiers
+
+    def _annotate_window(self, annotator, kwargs, tiers, pending_tier_names,
+                         invalid_start, invalid_end, context_sentences):
+        """
+        Run the annotator with the document region and tiers limited to the
+        sentences around the invalidated range.
+        """
+        sentences = tiers.get('spacy.sentences')
+        if sentences:
+            window_start, window_end = _expand_to_sentences(
+                sentences, invalid_start, invalid_end, context_sentences)
+        else:
+            window_start, window_end = 0, len(self.text)
+        self.region = window_start, window_end
+        self.tiers = {}
+        for tier_name, tier in tiers.items():
+            # Tiers that have not been updated yet are hidden from the
+            # annotator.
+            if tier_name in pending_tier_names:
+                continue
+            spans = tier.spans
+            self.tiers[tier_name] = AnnoTier([
+                span for span in spans[
+                    _first_span_starting_at(spans, window_start):
+                    _first_span_starting_at(spans, window_end)]
+                if span.end <= window_end], presorted=True)
+        result = annotator.annotate(self, **kwargs)
+        if isinstance(result, dict):
+            self.tiers.update(result)
+        return window_start, window_end
+
+    def _splice_tiers(self, tiers, tier_names, invalid_start, invalid_end):
+        """
+        Replace the spans that overlap the invalidated range in the given
+        tiers with the newly annotated ones and return the range covered by
+        the replaced and new spans.
+        """
+        spliced_start, spliced_end = invalid_start, invalid_end
+        invalid_span = AnnoSpan(invalid_start, invalid_end, self)
+        for tier_name in tier_names:
+            new_spans = [
+                span for span in self.tiers[tier_name]
+                if span.overlaps(invalid_span)]
+            old_spans = tiers[tier_name].spans if tier_name in tiers else []
+            spans = []
+            removed_spans = []
+            for span in old_spans:
+                if span.overlaps(invalid_span):
+                    removed_spans.append(span)
+                else:
+                    spans.append(span)
+            for span in new_spans + removed_spans:
+                spliced_start = min(spliced_start, span.start)
+                spliced_end = max(spliced_end, span.end)
+            tiers[tier_name] = AnnoTier(spans + new_spans)
+        return spliced_start, spliced_end
+
     def create_regex_tier(self, regex, label=None):
         """
         Create an AnnoTier from all the spans of text that match the regex.
         """
         spans = []
-        for match in re.finditer(regex, self.text):
+        start, end = self.region_bounds()
+        for match in compile_regex(regex).finditer(self.text, start, end):
             spans.append(
                 SpanGroup([AnnoSpan(
                     match.start(),
@@ -73,7 +436,7 @@ class AnnoDoc(object):
         """
         Convert the document into a json serializable dictionary.
         This does not store all the document's data. For a complete
-        serialization use pickle.
+        serialization use pickle or the serialization module.
 
         >>> from .annospan import AnnoSpan
         >>> from .annotier import AnnoTier
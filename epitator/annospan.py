@@ -1,9 +1,19 @@
 #!/usr/bin/env python
 # coding=utf8
 from __future__ import absolute_import
+from operator import attrgetter
 
 
 EMPTY_LIST = []
+# The attributes SpanGroups use to store the structure of their tree of base
+# spans. They are computed when they are first needed and are not part of
+# the state of pickled or serialized spans.
+SPAN_GROUP_CACHE_ATTRIBUTES = (
+    '_base_span_list', '_leaf_span_list', '_leaf_span_count', '_label_index')
+# A sort key that puts spans in the same order as AnnoSpan.__lt__.
+# Sorting with it compares tuples instead of calling __lt__, and like any
+# sort key it keeps equal spans in their original order.
+span_sort_key = attrgetter('start', 'end')
 
 
 class AnnoSpan(object):
@@ -178,6 +188,12 @@ class AnnoSpan(object):
             if not isinstance(span, SpanGroup):
                 yield span
 
+    def leaf_span_count(self):
+        """
+        The number of distinct leaf spans this span is made of.
+        """
+        return 1
+
 
 class SpanGroup(AnnoSpan):
     """
@@ -194,6 +210,116 @@ class SpanGroup(AnnoSpan):
             metadata)
         self.base_spans = base_spans
 
+    @classmethod
+    def from_bounds(cls, base_spans, start, end, label=None, metadata=None):
+        """
+        Create a SpanGroup with start and end offsets that have already been
+        computed from its base spans. Unlike the constructor this does not
+        check the base spans, so it is meant for creating groups in loops
+        where the offsets are known.
+
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('one two')
+        >>> SpanGroup.from_bounds([AnnoSpan(0, 3, doc), AnnoSpan(4, 7, doc)], 0, 7)
+        SpanGroup(text=one two, label=None, AnnoSpan(0-3, one), AnnoSpan(4-7, two))
+        """
+        span_group = cls.__new__(cls)
+        span_group.start = start
+        span_group.end = end
+        span_group.doc = base_spans[0].doc
+        span_group.metadata = metadata
+        span_group.label = label
+        span_group.base_spans = base_spans
+        return span_group
+
+    def __getstate__(self):
+        state = {}
+        for slot in AnnoSpan.__slots__:
+            try:
+                state[slot] = AnnoSpan.__dict__[slot].__get__(self, AnnoSpan)
+            except AttributeError:
+                pass
+        for key, value in self.__dict__.items():
+            if key not in SPAN_GROUP_CACHE_ATTRIBUTES:
+                state[key] = value
+        return state
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            if key in AnnoSpan.__slots__:
+                AnnoSpan.__dict__[key].__set__(self, value)
+            else:
+                self.__dict__[key] = value
+
+    def clear_cached_structure(self):
+        """
+        Remove the stored structure of the SpanGroup tree so it is computed
+        again. This needs to be called if the base spans are modified.
+        """
+        for attribute in SPAN_GROUP_CACHE_ATTRIBUTES:
+            self.__dict__.pop(attribute, None)
+
+    def iterate_base_spans(self):
+        """
+        Iterate over all base_spans including base_spans of child SpanGroups.
+        The flattened list of them is computed when it is first needed.
+
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('one two')
+        >>> one = AnnoSpan(0, 3, doc)
+        >>> list(SpanGroup([SpanGroup([one]), AnnoSpan(4, 7, doc)]).iterate_base_spans())
+        [SpanGroup(text=one, label=None, AnnoSpan(0-3, one)), AnnoSpan(0-3, one), AnnoSpan(4-7, two)]
+        """
+        base_span_list = self.__dict__.get('_base_span_list')
+        if base_span_list is None:
+            base_span_list = []
+            for span in self.base_spans:
+                base_span_list.append(span)
+                base_span_list.extend(span.iterate_base_spans())
+            self._base_span_list = base_span_list
+        return iter(base_span_list)
+
+    def iterate_leaf_base_spans(self):
+        leaf_span_list = self.__dict__.get('_leaf_span_list')
+        if leaf_span_list is None:
+            leaf_span_list = self._leaf_span_list = [
+                span for span in self.iterate_base_spans()
+                if not isinstance(span, SpanGroup)]
+        return iter(leaf_span_list)
+
+    def leaf_span_count(self):
+        """
+        The number of distinct leaf spans in the SpanGroup tree. It is
+        computed when it is first requested.
+
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('one two')
+        >>> one = AnnoSpan(0, 3, doc)
+        >>> SpanGroup([SpanGroup([one]), one, AnnoSpan(4, 7, doc)]).leaf_span_count()
+        2
+        """
+        count = self.__dict__.get('_leaf_span_count')
+        if count is None:
+            count = self._leaf_span_count = len(set(self.iterate_leaf_base_spans()))
+        return count
+
+    def groupdict(self):
+        # The labeled spans of the base spans are indexed when they are first
+        # needed. The lists are copied so callers can modify them.
+        label_index = self.__dict__.get('_label_index')
+        if label_index is None:
+            label_index = {}
+            for base_span in self.base_spans:
+                for key, values in base_span.groupdict().items():
+                    label_index.setdefault(key, []).extend(values)
+            for values in label_index.values():
+                values.sort()
+            self._label_index = label_index
+        out = {key: list(values) for key, values in label_index.items()}
+        if self.label:
+            out[self.label] = [self]
+        return out
+
     def __repr__(self):
         return ("SpanGroup("
                 "text=" + self.text + ", "
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# coding=utf8
+"""
+Annotate long documents in overlapping windows so only one window of text and
+its annotations are held in memory at a time.
+"""
+from __future__ import absolute_import
+import codecs
+import re
+import six
+from .annodoc import AnnoDoc, _shift_spans, _first_span_starting_at
+
+word_start_re = re.compile(r"(?<=\s)\S")
+
+
+class WindowText(object):
+    """
+    The text of a window of a streamed document indexed by offsets into the
+    whole document.
+
+    >>> text = WindowText('three four', 8)
+    >>> text[8:13]
+    'three'
+    >>> text[14]
+    'f'
+    >>> len(text)
+    18
+    """
+    __slots__ = ['text', 'offset']
+
+    def __init__(self, text, offset):
+        self.text = text
+        self.offset = offset
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = key.start
+            stop = key.stop
+            if start is not None:
+                start -= self.offset
+            if stop is not None:
+                stop -= self.offset
+            return self.text[start:stop:key.step]
+        return self.text[key - self.offset]
+
+    def __len__(self):
+        return self.offset + len(self.text)
+
+
+def _find_break(text, start, end):
+    """
+    Return the offset after the last paragraph, line or word break in the range.
+    """
+    for separator in ('\n\n', '\n', ' '):
+        idx = text.rfind(separator, start, end)
+        if idx >= 0:
+            return idx + len(separator)
+    return end
+
+
+def _sentence_start(doc, start, end, default):
+    """
+    Return the start of the first sentence beginning in the range or the
+    default if there isn't one. If the document has no sentence tier the
+    start of the first word is used.
+    """
+    sentences = doc.tiers.get('spacy.sentences')
+    if sentences:
+        spans = sentences.spans
+        idx = _first_span_starting_at(spans, start)
+        if idx < len(spans) and spans[idx].start < end:
+            return spans[idx].start
+        return default
+    match = word_start_re.search(doc.text, start, end)
+    if match:
+        return match.start()
+    return default
+
+
+def annotate_stream(text, annotators, date=None, tier_names=None,
+                    window_size=100000, overlap=5000):
+    """
+    Annotate the text in overlapping windows with the given annotators and
+    yield (tier name, span) pairs in document order as each window is
+    completed.
+
+    The text may be a string or an iterable of strings, like a file, so the
+    whole document never needs to be read into memory. Byte strings are
+    decoded as utf8, and a character may be split between them. Windows end
+    at a paragraph, line or word break and the next window starts at a
+    sentence boundary within the overlap. Each span is emitted by exactly one
+    window: the windows own the spans starting before a sentence boundary in
+    the middle of their overlap with the next window, so spans near a seam
+    are annotated with context on both sides. A span the next window finds
+    is dropped if it overlaps a span of the same tier the previous window
+    emitted, so a mention crossing the seam is only emitted once.
+
+    Emitted spans have offsets into the whole document. They only reference
+    the text of their window so memory stays bounded as long as the caller
+    does not keep all of them. The document date and the context annotators
+    record on the document, like the latest date mentioned and the recently
+    mentioned geonames, are carried from one window to the next.
+
+    >>> from .annotator import Annotator, AnnoTier
+    >>> class WordAnnotator(Annotator):
+    ...     def annotate(self, doc):
+    ...         return {'words': doc.create_regex_tier(r'\\w+')}
+    >>> spans = annotate_stream(
+    ...     ['one two ', 'three four five ', 'six'], [WordAnnotator()],
+    ...     window_size=16, overlap=6)
+    >>> [(span.start, str(span.text)) for tier_name, span in spans]
+    [(0, 'one'), (4, 'two'), (8, 'three'), (14, 'four'), (19, 'five'), (24, 'six')]
+    """
+    if overlap * 2 >= window_size:
+        raise ValueError("The overlap must be less than half the window size.")
+    if isinstance(text, six.string_types):
+        chunks = iter([text])
+    else:
+        chunks = iter(text)
+    decoder = codecs.getincrementaldecoder('utf8')()
+    # The context is only shared by the windows of this call.
+    context = {}
+    buffer = six.text_type()
+    # The offset in the buffer where the window starts. The buffer is only
+    # copied when more text is read into it, so a string is never copied
+    # except for the text of each window.
+    buffer_start = 0
+    # The offset of the start of the window in the document.
+    offset = 0
+    # The spans starting before this window offset were emitted by the
+    # previous window.
+    emitted_until = 0
+    # The maximum end offset in the document of the spans of each tier the
+    # previous window emitted.
+    emitted_ends = {}
+    exhausted = False
+    while True:
+        buffer_length = len(buffer) - buffer_start
+        if not exhausted and buffer_length <= window_size:
+            pieces = [buffer[buffer_start:]]
+            while buffer_length <= window_size:
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    exhausted = True
+                    pieces.append(decoder.decode(b'', True))
+                    break
+                if not isinstance(chunk, six.text_type):
+                    chunk = decoder.decode(chunk)
+                pieces.append(chunk)
+                buffer_length += len(chunk)
+            buffer = six.text_type().join(pieces)
+            buffer_start = 0
+        last_window = exhausted and buffer_length <= window_size
+        if last_window:
+            window_end = buffer_length
+        else:
+            window_end = _find_break(
+                buffer,
+                buffer_start + window_size - overlap,
+                buffer_start + window_size) - buffer_start
+        window_doc = AnnoDoc(
+            buffer[buffer_start:buffer_start + window_end], date=date)
+        window_doc.context = context
+        for annotator in annotators:
+            window_doc.add_tiers(annotator)
+        if last_window:
+            seam = window_end + 1
+        else:
+            next_start = _sentence_start(
+                window_doc, window_end - overlap, window_end,
+                window_end - overlap)
+            seam = max(emitted_until, _sentence_start(
+                window_doc, (next_start + window_end) // 2, window_end,
+                next_start))
+            next_start = min(next_start, seam)
+        spans = []
+        for tier_name, tier in window_doc.tiers.items():
+            if tier_names and tier_name not in tier_names:
+                continue
+            # Spans overlapping a span the previous window emitted start
+            # before its end.
+            overlap_end = emitted_ends.get(tier_name, 0) - offset
+            for span in tier.spans:
+                if emitted_until <= span.start < seam and span.start >= overlap_end:
+                    spans.append((tier_name, span))
+        # The tiers are released so the emitted spans only hold on to the
+        # window's text.
+        window_doc.tiers = {}
+        window_doc.annotation_history = []
+        window_doc.context = None
+        _shift_spans([span for tier_name, span in spans], 0, offset, set())
+        window_doc.text = WindowText(window_doc.text, offset)
+        spans.sort(key=lambda pair: (pair[1].start, pair[1].end, pair[0]))
+        emitted_ends = {}
+        for tier_name, span in spans:
+            if span.end > emitted_ends.get(tier_name, 0):
+                emitted_ends[tier_name] = span.end
+        for pair in spans:
+            yield pair
+        if last_window:
+            return
+        emitted_until = seam - next_start
+        offset += next_start
+        buffer_start += next_start
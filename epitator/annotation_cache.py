@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# coding=utf8
+"""
+A cache of annotation results keyed by the content they are derived from.
+"""
+from __future__ import absolute_import
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import types
+import six
+from . import serialization
+from .annodoc import SPACY_TIER_NAMES
+from .get_database_connection import ANNOTATOR_DB_PATH
+from .version import __version__
+
+if os.environ.get('ANNOTATOR_CACHE_PATH'):
+    ANNOTATOR_CACHE_PATH = os.environ.get('ANNOTATOR_CACHE_PATH')
+else:
+    ANNOTATOR_CACHE_PATH = os.path.expanduser("~") + '/.epitator.cache.sqlitedb'
+
+
+def _class_path(cls):
+    return cls.__module__ + '.' + cls.__name__
+
+
+def _config_value(value):
+    """
+    Convert an annotator attribute into a json serializable value. Objects
+    other than basic data types are identified by their class or module.
+    """
+    if value is None or isinstance(value, (bool, float) + six.integer_types + six.string_types):
+        return value
+    elif isinstance(value, (list, tuple)):
+        return [_config_value(item) for item in value]
+    elif isinstance(value, dict):
+        return sorted(
+            [six.text_type(key), _config_value(item)]
+            for key, item in value.items())
+    elif isinstance(value, types.ModuleType):
+        return value.__name__
+    return _class_path(type(value))
+
+
+def _annotator_config(annotator):
+    """
+    Return the attributes of the annotator that configure its results.
+    Private attributes, which hold state annotators create lazily, and
+    database connections are left out. The contents of the database are
+    identified by its version instead.
+    """
+    return {
+        name: _config_value(value)
+        for name, value in vars(annotator).items()
+        if not name.startswith('_') and
+        not isinstance(value, sqlite3.Connection)}
+
+
+def database_version():
+    """
+    Return a string identifying the version and contents of the annotator
+    database. The file modification time and size are included because
+    reimporting data does not change the schema version.
+    """
+    if not os.path.exists(ANNOTATOR_DB_PATH):
+        return None
+    connection = sqlite3.connect(ANNOTATOR_DB_PATH)
+    try:
+        db_version = next(connection.execute("""
+        SELECT value FROM metadata WHERE property = 'dbversion'
+        """), [None])[0]
+    except sqlite3.OperationalError:
+        db_version = None
+    finally:
+        connection.close()
+    stat = os.stat(ANNOTATOR_DB_PATH)
+    return '%s:%d:%d' % (db_version, stat.st_mtime, stat.st_size)
+
+
+class AnnotationCache(object):
+    """
+    Cache the tiers annotators produce in an SQLite database so annotating
+    a document that was annotated before only needs to load them.
+
+    Results are keyed by a hash of the document text and date, the
+    annotator's class, public attributes and keyword arguments, the names of the
+    tiers the document already has, and the versions of EpiTator and the
+    annotator database. When the cache grows beyond max_size bytes the least
+    recently used results are evicted.
+
+    The tiers the SpacyAnnotator creates are not cached because the snapshots
+    stored in place of spaCy tokens and spans don't include the parse tree.
+    Annotators that need them will run spaCy again.
+    """
+    def __init__(self, path=None, max_size=2 ** 30):
+        self.path = path or ANNOTATOR_CACHE_PATH
+        self.max_size = max_size
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("""
+        CREATE TABLE IF NOT EXISTS annotations (
+            key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_used REAL
+        )""")
+        self.connection.execute("""
+        CREATE INDEX IF NOT EXISTS annotations_last_used
+        ON annotations (last_used)""")
+        self.connection.commit()
+        self.database_version = database_version()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, doc, annotator, kwargs):
+        """
+        Return the key of the tiers the annotator would produce for the
+        document.
+        """
+        content = json.dumps([
+            __version__,
+            self.database_version,
+            _class_path(type(annotator)),
+            _annotator_config(annotator),
+            _config_value(kwargs),
+            doc.date.isoformat() if doc.date else None,
+            doc.region,
+            sorted(
+                name for name in doc.tiers.keys()
+                if name not in SPACY_TIER_NAMES),
+        ], sort_keys=True)
+        hasher = hashlib.sha256(content.encode('utf8'))
+        hasher.update(doc.text.encode('utf8'))
+        return hasher.hexdigest()
+
+    def add_tiers(self, doc, annotator, **kwargs):
+        """
+        Add the tiers the annotator produces to the document, loading them
+        from the cache when possible.
+        """
+        key = self.key(doc, annotator, kwargs)
+        row = next(self.connection.execute(
+            "SELECT value FROM annotations WHERE key = ?", (key,)), None)
+        if row:
+            self.hits += 1
+            previous_tiers = dict(doc.tiers)
+            serialization.loads(bytes(row[0]), doc)
+            doc.annotation_history.append((annotator, kwargs, [
+                tier_name for tier_name, tier in doc.tiers.items()
+                if previous_tiers.get(tier_name) is not tier]))
+            self.connection.execute(
+                "UPDATE annotations SET last_used = ? WHERE key = ?",
+                (time.time(), key))
+            self.connection.commit()
+            return doc
+        self.misses += 1
+        previous_tiers = dict(doc.tiers)
+        doc.add_tiers(annotator, **kwargs)
+        tier_names = [
+            tier_name for tier_name, tier in doc.tiers.items()
+            if previous_tiers.get(tier_name) is not tier and
+            tier_name not in SPACY_TIER_NAMES]
+        value = serialization.dumps(doc, tier_names)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO annotations VALUES (?, ?, ?, ?)",
+            (key, sqlite3.Binary(value), len(value), time.time()))
+        self.evict()
+        self.connection.commit()
+        return doc
+
+    def size(self):
+        """
+        Return the total size of the cached results in bytes.
+        """
+        return next(self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM annotations"))[0]
+
+    def evict(self):
+        """
+        Remove the least recently used results until the cache fits in its
+        maximum size.
+        """
+        excess = self.size() - self.max_size
+        if excess <= 0:
+            return
+        evicted_keys = []
+        for key, size in self.connection.execute(
+                "SELECT key, size FROM annotations ORDER BY last_used"):
+            if excess <= 0:
+                break
+            evicted_keys.append((key,))
+            excess -= size
+        self.connection.executemany(
+            "DELETE FROM annotations WHERE key = ?", evicted_keys)
+
+    def clear(self):
+        self.connection.execute("DELETE FROM annotations")
+        self.connection.commit()
+
+    def report(self):
+        """
+        Return a dict with the number of cache hits and misses, the hit rate,
+        and the number and total size of the cached results.
+        """
+        lookups = self.hits + self.misses
+        entries, size = next(self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM annotations"))
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            'entries': entries,
+            'size': size,
+        }
@@ -2,13 +2,107 @@
 # coding=utf8
 from __future__ import absolute_import
 import re
-from .annospan import SpanGroup, AnnoSpan
+from bisect import bisect_left, bisect_right
+import six
+from .annospan import SpanGroup, AnnoSpan, span_sort_key
 from . import maximum_weight_interval_set as mwis
 
+# The maximum number of compiled regular expressions kept by compile_regex.
+# The cache is cleared when it is full.
+MAX_REGEX_CACHE_SIZE = 256
+_regex_cache = {}
+
+
+def compile_regex(regex, flags=0):
+    """
+    Return the compiled regular expression, reusing patterns compiled by
+    earlier calls.
+    """
+    key = (regex, flags)
+    compiled_regex = _regex_cache.get(key)
+    if compiled_regex is None:
+        if len(_regex_cache) >= MAX_REGEX_CACHE_SIZE:
+            _regex_cache.clear()
+        compiled_regex = _regex_cache[key] = re.compile(regex, flags)
+    return compiled_regex
+
+
+# Patterns with these constructs can match differently at the start of a
+# span's text than at its offset in the document text, because they look at
+# the characters before it.
+start_context_re = re.compile(r"\^|\\[AbB]|\(\?<[=!]")
+
+
+def matches_at_offsets(compiled_regex):
+    """
+    Return true if matching the regular expression against the document text
+    between a span's offsets gives the same result as matching it against
+    the span's text.
+    """
+    return not start_context_re.search(compiled_regex.pattern)
+
+
+def following_span_pairs(spans, other_spans, max_dist, allow_overlap):
+    """
+    Return the pairs of spans where the span from other_spans follows the
+    span from spans by at most max_dist characters, in the order used by
+    AnnoTier.with_following_spans_from. other_spans must be sorted.
+
+    The other spans that could follow each span are found by advancing a
+    window over them, so the pairs are found in a single pass when the
+    spans are sorted.
+    """
+    other_starts = [span.start for span in other_spans]
+    other_ends = [span.end for span in other_spans]
+    other_count = len(other_spans)
+    other_idx = 0
+    pairs = []
+    for span in spans:
+        start = span.start
+        end = span.end
+        window_end = end + max_dist + 1
+        # Skip the other spans that end before this span starts.
+        while other_idx < other_count and other_ends[other_idx] <= start:
+            other_idx += 1
+        following = False
+        other_idx_2 = other_idx
+        while other_idx_2 < other_count and other_starts[other_idx_2] < window_end:
+            # Once one of the other spans in the window follows this span,
+            # it is paired with the rest of the spans in the window.
+            if not following:
+                if allow_overlap:
+                    following = start < other_starts[other_idx_2]
+                else:
+                    following = end <= other_starts[other_idx_2]
+            if following:
+                pairs.append((span, other_spans[other_idx_2]))
+            other_idx_2 += 1
+    return pairs
+
+
+def span_pair(span, other_span):
+    """
+    Create a SpanGroup from two spans.
+    """
+    start = span.start
+    end = span.end
+    other_start = other_span.start
+    other_end = other_span.end
+    return SpanGroup.from_bounds(
+        [span, other_span],
+        start if start <= other_start else other_start,
+        end if end >= other_end else other_end)
+
 
 class AnnoTier(object):
     """
     A group of AnnoSpans stored sorted by start offset.
+    Spans with the same offsets keep their original order.
+
+    >>> from .annodoc import AnnoDoc
+    >>> doc = AnnoDoc('one two')
+    >>> AnnoTier([AnnoSpan(4, 7, doc, 'b'), AnnoSpan(0, 3, doc), AnnoSpan(4, 7, doc, 'a')])
+    AnnoTier([AnnoSpan(0-3, one), AnnoSpan(4-7, b), AnnoSpan(4-7, a)])
     """
     def __init__(self, spans=None, presorted=False):
         if spans is None:
@@ -19,7 +113,7 @@ class AnnoTier(object):
             if presorted:
                 self.spans = spans
             else:
-                self.spans = sorted(spans)
+                self.spans = sorted(spans, key=span_sort_key)
 
     def __repr__(self):
         return ('AnnoTier([' +
@@ -30,7 +124,12 @@ class AnnoTier(object):
         return len(self.spans)
 
     def __add__(self, other_tier):
-        return AnnoTier(self.spans + other_tier.spans)
+        # Sorting the concatenated lists merges the two sorted runs in linear
+        # time, and the spans from this tier stay before equal spans from the
+        # other tier.
+        return AnnoTier(
+            sorted(self.spans + other_tier.spans, key=span_sort_key),
+            presorted=True)
 
     def __iter__(self):
         return iter(self.spans)
@@ -38,6 +137,37 @@ class AnnoTier(object):
     def __getitem__(self, idx):
         return self.spans[idx]
 
+    def _range_index(self):
+        """
+        Return the start offsets of the spans and the running maximum of
+        their end offsets for bisecting, and whether the end offsets are
+        sorted. None is returned if the spans are not sorted by start offset.
+        The index is rebuilt when the tier's span list is replaced or its
+        length changes.
+        """
+        spans = self.spans
+        index = getattr(self, '_index', None)
+        if index is None or index[0] is not spans or index[1] != len(spans):
+            starts = []
+            max_ends = []
+            max_end = None
+            ends_sorted = True
+            for span in spans:
+                if starts and span.start < starts[-1]:
+                    starts = None
+                    break
+                end = span.end
+                if max_end is None or end >= max_end:
+                    max_end = end
+                else:
+                    ends_sorted = False
+                starts.append(span.start)
+                max_ends.append(max_end)
+            index = self._index = (spans, len(spans), starts, max_ends, ends_sorted)
+        if index[2] is None:
+            return None
+        return index[2:]
+
     def subtract_overlaps(self, other_tier):
         """
         :param other_tier: The spans to be removed from the territory of this tier
@@ -105,7 +235,7 @@ class AnnoTier(object):
         if isinstance(other_tier, AnnoTier):
             other_spans = other_tier.spans
         else:
-            other_spans = sorted(other_tier)
+            other_spans = sorted(other_tier, key=span_sort_key)
         other_spans_idx = 0
         for span in self.spans:
             span_group = []
@@ -146,9 +276,16 @@ class AnnoTier(object):
         >>> tier1.spans_contained_by_span(span1)
         AnnoTier([AnnoSpan(4-7, two)])
         """
-        return(
-            AnnoTier([span for span in self if selector_span.contains(span)])
-        )
+        index = self._range_index()
+        if index is None:
+            return AnnoTier([span for span in self if selector_span.contains(span)])
+        starts = index[0]
+        # Only spans starting within the selector span can be contained by it.
+        return AnnoTier([
+            span for span in self.spans[
+                bisect_left(starts, selector_span.start):
+                bisect_right(starts, selector_span.end)]
+            if selector_span.contains(span)], presorted=True)
 
     def spans_overlapped_by_span(self, selector_span):
         """
@@ -163,9 +300,21 @@ class AnnoTier(object):
         >>> tier1.spans_overlapped_by_span(span1)
         AnnoTier([AnnoSpan(0-3, one)])
         """
-        return(
-            AnnoTier([span for span in self if selector_span.overlaps(span)])
-        )
+        index = self._range_index()
+        if index is None:
+            return AnnoTier([span for span in self if selector_span.overlaps(span)])
+        starts, max_ends, ends_sorted = index
+        # Overlapping spans start before the end of the selector span and
+        # end after its start or start at its start, so they come after the
+        # first span whose running maximum end is past the selector span's
+        # start or the first span starting at it.
+        return AnnoTier([
+            span for span in self.spans[
+                min(bisect_right(max_ends, selector_span.start),
+                    bisect_left(starts, selector_span.start)):
+                max(bisect_right(starts, selector_span.start),
+                    bisect_left(starts, selector_span.end))]
+            if selector_span.overlaps(span)], presorted=True)
 
     def with_label(self, label):
         """
@@ -201,16 +350,26 @@ class AnnoTier(object):
         ...                  AnnoSpan(8, 13, doc, 'odd')])
         >>> tier.optimal_span_set()
         AnnoTier([AnnoSpan(0-3, odd), AnnoSpan(3-13, long_span)])
+        >>> tier.optimal_span_set(prefer='num_spans')
+        AnnoTier([AnnoSpan(0-3, odd), AnnoSpan(4-7, even), AnnoSpan(8-13, odd)])
+        >>> tier.optimal_span_set(prefer='first')
+        AnnoTier([AnnoSpan(0-3, odd), AnnoSpan(3-13, long_span)])
         """
         all_spans = self.spans
+        first_positions = {}
 
         def first(x):
             """
             Perfers the matches that appear first in the first result list.
             """
+            # The position of each span is looked up instead of searching
+            # the list for it.
+            if not first_positions:
+                for idx, span in enumerate(all_spans):
+                    first_positions.setdefault(id(span), idx)
             # Using an exponent makes it so that a first match will be prefered
             # over multiple non-overlapping later matches.
-            return 2 ** (len(all_spans) - all_spans.index(x))
+            return 2 ** (len(all_spans) - first_positions[id(x)])
 
         def text_length(x):
             """
@@ -231,17 +390,16 @@ class AnnoTier(object):
             """
             Prefers the match with the most distinct base spans.
             """
-            if isinstance(x, SpanGroup):
-                return len(set(x.iterate_leaf_base_spans()))
-            else:
-                return 1
+            return x.leaf_span_count()
 
         def num_spans_and_no_linebreaks(x):
             """
             Same as num_spans, but linebreaks are avoided as a secondary objective,
             and overall text length is minimized as a third objective.
             """
-            return num_spans(x), int("\n" not in x.text), -len(x)
+            # The document text is searched in place so the span's text
+            # doesn't need to be copied.
+            return num_spans(x), int(x.doc.text.find("\n", x.start, x.end) < 0), -len(x)
 
         if prefer == "first":
             prefunc = first
@@ -292,7 +450,7 @@ class AnnoTier(object):
         result = []
         for span, group in span_groups:
             for other_span in group:
-                result.append(SpanGroup([span, other_span]))
+                result.append(span_pair(span, other_span))
         return AnnoTier(result)
 
     def with_nearby_spans_from(self, other_tier, max_dist=100):
@@ -300,9 +458,13 @@ class AnnoTier(object):
         Create a new tier from pairs spans in this tier and the other tier
         that are near eachother.
         """
-        return AnnoTier(
-            self.with_following_spans_from(other_tier, max_dist=max_dist, allow_overlap=True) +
-            other_tier.with_following_spans_from(self, max_dist=max_dist, allow_overlap=True))
+        spans = self.spans
+        other_spans = other_tier.spans
+        return AnnoTier([
+            span_pair(span, other_span)
+            for span, other_span in
+            following_span_pairs(spans, other_spans, max_dist, True) +
+            following_span_pairs(other_spans, spans, max_dist, True)])
 
     def with_following_spans_from(self, other_tier, max_dist=1, allow_overlap=False):
         """
@@ -317,29 +479,14 @@ class AnnoTier(object):
         >>> tier1.with_following_spans_from(tier2)
         AnnoTier([SpanGroup(text=three four, label=None, AnnoSpan(8-13, three), AnnoSpan(14-18, four))])
         """
-        extended_spans = []
-        for span in self:
-            extended_spans.append(
-                AnnoSpan(span.start, span.end + max_dist + 1, span.doc, metadata=span))
-        extended_spans = AnnoTier(extended_spans, presorted=True)
-        span_groups = extended_spans.group_spans_by_containing_span(other_tier,
-                                                                    allow_partial_containment=True)
-        if allow_overlap:
-            def starts_before_f(span_a, span_b):
-                return span_a.start < span_b.start
+        if isinstance(other_tier, AnnoTier):
+            other_spans = other_tier.spans
         else:
-            def starts_before_f(span_a, span_b):
-                return span_a.end <= span_b.start
-        result = []
-        for extended_span, span_group in span_groups:
-            idx = 0
-            for span in span_group:
-                if starts_before_f(extended_span.metadata, span):
-                    break
-                idx += 1
-            for span in span_group[idx:]:
-                result.append(SpanGroup([extended_span.metadata, span]))
-        return AnnoTier(result)
+            other_spans = sorted(other_tier, key=span_sort_key)
+        return AnnoTier([
+            span_pair(span, other_span)
+            for span, other_span in following_span_pairs(
+                self.spans, other_spans, max_dist, allow_overlap)])
 
     def combined_adjacent_spans(self, max_dist=1):
         """
@@ -360,33 +507,60 @@ class AnnoTier(object):
         for span in self:
             if not prev_span:
                 span_group = [span]
+                group_start = span.start
+                group_end = span.end
             elif prev_span.end + max_dist >= span.start:
                 span_group.append(span)
+                if span.start < group_start:
+                    group_start = span.start
+                if span.end > group_end:
+                    group_end = span.end
             else:
-                span_groups.append(SpanGroup(span_group))
+                span_groups.append(
+                    SpanGroup.from_bounds(span_group, group_start, group_end))
                 span_group = [span]
+                group_start = span.start
+                group_end = span.end
             prev_span = span
         if span_group:
-            span_groups.append(SpanGroup(span_group))
+            span_groups.append(
+                SpanGroup.from_bounds(span_group, group_start, group_end))
         return AnnoTier(span_groups)
 
     def chains(self, at_least=1, at_most=None, max_dist=1):
         """
         Create a new tier from all chains of spans within max_dist of eachother.
-        """
-        combined_spans = AnnoTier()
-        new_combined_spans = self
+
+        >>> from .annospan import AnnoSpan
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('one two three')
+        >>> tier = AnnoTier([AnnoSpan(0, 3, doc),
+        ...                  AnnoSpan(4, 7, doc),
+        ...                  AnnoSpan(8, 13, doc)])
+        >>> [span.text for span in tier.chains(at_least=2)]
+        ['one two', 'one two three', 'two three']
+        """
+        spans = self.spans
+        combined_spans = []
+        new_combined_spans = spans
         chain_len = 1
         while True:
             if chain_len >= at_least:
-                combined_spans += new_combined_spans
+                combined_spans.extend(new_combined_spans)
             if len(new_combined_spans) == 0:
                 break
             chain_len += 1
             if at_most and chain_len > at_most:
                 break
-            new_combined_spans = new_combined_spans.with_following_spans_from(self, max_dist=max_dist)
-        return combined_spans
+            # Each chain is extended by the spans that follow it, so the
+            # chains of the previous length are the only ones revisited.
+            new_combined_spans = AnnoTier([
+                span_pair(chain, span)
+                for chain, span in following_span_pairs(
+                    new_combined_spans, spans, max_dist, False)]).spans
+        # The chains of each length are sorted, so this gives the same
+        # order as adding the tiers of each length together.
+        return AnnoTier(combined_spans)
 
     def span_before(self, target_span, allow_overlap=True):
         """
@@ -401,32 +575,79 @@ class AnnoTier(object):
         >>> tier.span_before(AnnoSpan(4, 7, doc))
         AnnoSpan(0-3, one)
         """
-        closest_span = None
-        for span in self:
-            if span.start >= target_span.start:
-                break
-            if not allow_overlap and span.end > target_span.start:
-                break
-            closest_span = span
-        return closest_span
+        index = self._range_index()
+        if index is None:
+            closest_span = None
+            for span in self:
+                if span.start >= target_span.start:
+                    break
+                if not allow_overlap and span.end > target_span.start:
+                    break
+                closest_span = span
+            return closest_span
+        starts, max_ends, ends_sorted = index
+        # The spans up to the first one starting at or after the target span,
+        # or the first one ending after its start if overlaps aren't allowed.
+        idx = bisect_left(starts, target_span.start)
+        if not allow_overlap:
+            idx = min(idx, bisect_right(max_ends, target_span.start))
+        if idx > 0:
+            return self.spans[idx - 1]
+        return None
 
     def span_after(self, target_span):
         """
         Find the nearest span that comes after the target span.
-        """
-        span = None
-        for span in self:
-            if span.start >= target_span.end:
-                break
-        return span
+
+        >>> from .annospan import AnnoSpan
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('one two three four')
+        >>> tier = AnnoTier([AnnoSpan(0, 3, doc),
+        ...                  AnnoSpan(8, 13, doc),
+        ...                  AnnoSpan(14, 18, doc)])
+        >>> tier.span_after(AnnoSpan(4, 7, doc))
+        AnnoSpan(8-13, three)
+        """
+        index = self._range_index()
+        if index is None:
+            span = None
+            for span in self:
+                if span.start >= target_span.end:
+                    break
+            return span
+        # Like a scan over the tier, the last span is returned when none
+        # start after the target span.
+        idx = bisect_left(index[0], target_span.end)
+        if idx < len(self.spans):
+            return self.spans[idx]
+        elif self.spans:
+            return self.spans[-1]
+        return None
 
     def nearest_to(self, target_span):
         """
         Find the nearest span to the target span.
+
+        >>> from .annospan import AnnoSpan
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('one two three four')
+        >>> tier = AnnoTier([AnnoSpan(0, 3, doc),
+        ...                  AnnoSpan(14, 18, doc)])
+        >>> tier.nearest_to(AnnoSpan(8, 13, doc))
+        AnnoSpan(14-18, four)
         """
         closest_span = None
         min_distance = None
-        for span in self:
+        spans = self.spans
+        idx = 0
+        index = self._range_index()
+        if index and index[2]:
+            # When the end offsets are sorted the distances of the spans
+            # starting before the target span never increase, so the scan
+            # can start at the last of them.
+            idx = max(0, bisect_left(index[0], target_span.start) - 1)
+        for idx in range(idx, len(spans)):
+            span = spans[idx]
             span_distance = span.distance(target_span)
             if closest_span is None or span_distance <= min_distance:
                 closest_span = span
@@ -442,19 +663,68 @@ class AnnoTier(object):
         Create a new tier based on this one
         with labeled spans that can be looked up by groupdict.
         """
-        return AnnoTier([SpanGroup([span], label) for span in self], presorted=True)
+        return AnnoTier([
+            SpanGroup.from_bounds([span], span.start, span.end, label)
+            for span in self], presorted=True)
 
     def search_spans(self, regex, label=None):
         """
         Search spans for ones matching the given regular expression.
         """
-        regex = re.compile(regex + r'$', re.I)
+        regex = compile_regex(regex + r'$', re.I)
+        at_offsets = matches_at_offsets(regex)
         match_spans = []
         for span in self:
-            if regex.match(span.text):
-                match_spans.append(SpanGroup([span], label))
+            # The document text is matched between the span's offsets so
+            # the span's text doesn't need to be copied.
+            text = span.doc.text
+            if at_offsets and isinstance(text, six.string_types):
+                match = regex.match(text, span.start, span.end)
+            else:
+                match = regex.match(span.text)
+            if match:
+                match_spans.append(
+                    SpanGroup.from_bounds([span], span.start, span.end, label))
         return AnnoTier(match_spans, presorted=True)
 
+    def search_spans_multi(self, regexes, labels=None):
+        """
+        Search spans for ones matching each of the given regular expressions
+        in a single pass over the tier. A tier like the one search_spans
+        would return is created for each regular expression.
+
+        >>> from .annospan import AnnoSpan
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('one two three')
+        >>> tier = AnnoTier([AnnoSpan(0, 3, doc),
+        ...                  AnnoSpan(4, 7, doc),
+        ...                  AnnoSpan(8, 13, doc)])
+        >>> tier.search_spans_multi([r'one|two', r'three'], labels=['a', 'b'])
+        [AnnoTier([SpanGroup(text=one, label=a, AnnoSpan(0-3, one)), \
+SpanGroup(text=two, label=a, AnnoSpan(4-7, two))]), \
+AnnoTier([SpanGroup(text=three, label=b, AnnoSpan(8-13, three))])]
+        """
+        if labels is None:
+            labels = [None] * len(regexes)
+        compiled_regexes = [
+            compile_regex(regex + r'$', re.I) for regex in regexes]
+        at_offsets = all(matches_at_offsets(regex) for regex in compiled_regexes)
+        match_spans = [[] for regex in regexes]
+        for span in self:
+            text = span.doc.text
+            if at_offsets and isinstance(text, six.string_types):
+                start = span.start
+                end = span.end
+            else:
+                text = span.text
+                start = 0
+                end = len(text)
+            for regex, label, spans in zip(compiled_regexes, labels, match_spans):
+                if regex.match(text, start, end):
+                    spans.append(
+                        SpanGroup.from_bounds([span], span.start, span.end, label))
+        return [AnnoTier(spans, presorted=True) for spans in match_spans]
+
     def match_subspans(self, regex):
         """
         Create a new tier from the components of spans matching the given
@@ -468,14 +738,63 @@ class AnnoTier(object):
         ...                  AnnoSpan(14, 18, doc)])
         >>> tier.match_subspans(r"two")
         AnnoTier([AnnoSpan(4-7, two)])
+        >>> AnnoTier([AnnoSpan(9, 13, doc)]).match_subspans(r"\\bhree")
+        AnnoTier([AnnoSpan(9-13, hree)])
         """
-        regex = re.compile(regex)
+        regex = compile_regex(regex)
+        at_offsets = matches_at_offsets(regex)
         match_spans = []
         for span in self:
-            for match in regex.finditer(span.text):
+            text = span.doc.text
+            if at_offsets and isinstance(text, six.string_types):
+                matches = regex.finditer(text, span.start, span.end)
+                offset = 0
+            else:
+                matches = regex.finditer(span.text)
+                offset = span.start
+            for match in matches:
                 match_spans.append(AnnoSpan(
-                    match.start() + span.start,
-                    match.end() + span.start,
+                    match.start() + offset,
+                    match.end() + offset,
                     span.doc
                 ))
         return AnnoTier(match_spans, presorted=True)
+
+    def group_regex_matches(self, regex):
+        """
+        Group the matches of the regular expression in the document text by
+        the spans in this tier that contain them. The result is like
+        group_spans_by_containing_span(doc.create_regex_tier(regex)) but the
+        document is scanned once and spans are only created for the matches
+        in a group.
+
+        >>> from .annospan import AnnoSpan
+        >>> from .annodoc import AnnoDoc
+        >>> doc = AnnoDoc('one, two. three, four, five.')
+        >>> tier = AnnoTier([AnnoSpan(0, 9, doc), AnnoSpan(10, 28, doc)])
+        >>> [(span.text, matches) for span, matches in tier.group_regex_matches(',')]
+        [('one, two.', [AnnoSpan(3-4, ,)]), ('three, four, five.', [AnnoSpan(15-16, ,), AnnoSpan(21-22, ,)])]
+        """
+        spans = self.spans
+        if len(spans) == 0:
+            return
+        doc = spans[0].doc
+        region_start, region_end = doc.region_bounds()
+        match_starts = []
+        match_ends = []
+        for match in compile_regex(regex).finditer(doc.text, region_start, region_end):
+            match_starts.append(match.start())
+            match_ends.append(match.end())
+        match_idx = 0
+        match_count = len(match_starts)
+        for span in spans:
+            while match_idx < match_count and match_starts[match_idx] < span.start:
+                match_idx += 1
+            group = []
+            match_idx_2 = match_idx
+            while match_idx_2 < match_count and match_starts[match_idx_2] < span.end:
+                if match_ends[match_idx_2] <= span.end:
+                    group.append(AnnoSpan(
+                        match_starts[match_idx_2], match_ends[match_idx_2], doc))
+                match_idx_2 += 1
+            yield span, group
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# coding=utf8
+"""
+An AnnoTier that stores the offsets and labels of its spans in arrays.
+"""
+from __future__ import absolute_import
+from array import array
+from .annospan import AnnoSpan, span_sort_key
+from .annotier import AnnoTier, span_pair
+from . import maximum_weight_interval_set as mwis
+
+
+def _offsets(tier):
+    """
+    Return the start offsets, end offsets and a function that returns the
+    span at an index for a tier or a list of spans.
+    """
+    if isinstance(tier, ColumnarAnnoTier) and tier.starts is not None:
+        return tier.starts, tier.ends, tier.span_at
+    if isinstance(tier, AnnoTier):
+        spans = tier.spans
+    else:
+        spans = sorted(tier, key=span_sort_key)
+    return [span.start for span in spans], [span.end for span in spans], spans.__getitem__
+
+
+def _group_indices(starts, ends, other_starts, other_ends, allow_partial_containment):
+    """
+    Yield the index of each span and a list of the indices of the other spans
+    in its group, like AnnoTier.group_spans_by_containing_span.
+    """
+    other_idx = 0
+    other_count = len(other_starts)
+    for idx in range(len(starts)):
+        start = starts[idx]
+        end = ends[idx]
+        # Skip the other spans that come before this span.
+        if allow_partial_containment:
+            while other_idx < other_count and other_ends[other_idx] <= start:
+                other_idx += 1
+        else:
+            while other_idx < other_count and other_starts[other_idx] < start:
+                other_idx += 1
+        group = []
+        other_idx_2 = other_idx
+        while other_idx_2 < other_count and other_starts[other_idx_2] < end:
+            if allow_partial_containment or other_ends[other_idx_2] <= end:
+                group.append(other_idx_2)
+            other_idx_2 += 1
+        yield idx, group
+
+
+class ColumnarAnnoTier(AnnoTier):
+    """
+    An AnnoTier that stores the start offsets, end offsets and label ids of
+    its spans in arrays. Span objects are only created when they are
+    accessed, and the same object is returned each time a span is accessed.
+    Tiers derived from a columnar tier, like the result of without_overlaps,
+    share its span objects.
+
+    group_spans_by_containing_span, without_overlaps, optimal_span_set with
+    the default preference and with_following_spans_from work on the arrays.
+    Other methods access the spans like a regular AnnoTier. Assigning a list
+    of spans to the tier's spans attribute replaces the arrays.
+
+    >>> from .annodoc import AnnoDoc
+    >>> doc = AnnoDoc('one two three')
+    >>> tier = ColumnarAnnoTier(doc, [8, 0, 4], [13, 3, 7], ['odd', 'odd', 'even'])
+    >>> tier.without_overlaps(AnnoTier([AnnoSpan(5, 6, doc)]))
+    AnnoTier([AnnoSpan(0-3, odd), AnnoSpan(8-13, odd)])
+    >>> tier.spans[0] is tier.without_overlaps(AnnoTier()).spans[0]
+    True
+    """
+    def __init__(self, doc, starts, ends, labels=None, presorted=False):
+        self.doc = doc
+        starts = array('l', starts)
+        ends = array('l', ends)
+        self.label_names = [None]
+        label_ids = {None: 0}
+        if labels is None:
+            self.label_ids = array('l', [0]) * len(starts)
+        else:
+            self.label_ids = array('l', [
+                label_ids.setdefault(label, len(label_ids)) for label in labels])
+            self.label_names = [None] * len(label_ids)
+            for label, label_id in label_ids.items():
+                self.label_names[label_id] = label
+        if not presorted:
+            order = sorted(range(len(starts)), key=lambda idx: (starts[idx], ends[idx]))
+            starts = array('l', [starts[idx] for idx in order])
+            ends = array('l', [ends[idx] for idx in order])
+            self.label_ids = array('l', [self.label_ids[idx] for idx in order])
+        self.starts = starts
+        self.ends = ends
+        # The span objects created so far. They are shared by the tiers
+        # derived from this one, which map their indices into this list.
+        self.span_objects = None
+        self.object_indices = None
+        self._spans = None
+
+    @classmethod
+    def from_tier(cls, tier):
+        """
+        Create a columnar tier with the offsets and labels of the spans in
+        the tier. The existing span objects are returned when the spans are
+        accessed.
+        """
+        spans = tier.spans
+        doc = spans[0].doc if spans else None
+        result = cls(doc,
+                     [span.start for span in spans],
+                     [span.end for span in spans],
+                     [span.label for span in spans],
+                     presorted=True)
+        result.span_objects = list(spans)
+        return result
+
+    def _subset(self, indices):
+        """
+        Create a tier with the spans at the given indices that shares this
+        tier's span objects.
+        """
+        result = ColumnarAnnoTier.__new__(ColumnarAnnoTier)
+        result.doc = self.doc
+        result.label_names = self.label_names
+        result.starts = array('l', [self.starts[idx] for idx in indices])
+        result.ends = array('l', [self.ends[idx] for idx in indices])
+        result.label_ids = array('l', [self.label_ids[idx] for idx in indices])
+        if self.span_objects is None:
+            self.span_objects = [None] * len(self.starts)
+        result.span_objects = self.span_objects
+        if self.object_indices is None:
+            result.object_indices = array('l', indices)
+        else:
+            result.object_indices = array('l', [self.object_indices[idx] for idx in indices])
+        result._spans = None
+        return result
+
+    def span_at(self, idx):
+        """
+        Return the span at the index, creating it if it has not been accessed
+        before.
+        """
+        if self.starts is None:
+            return self._spans[idx]
+        if self.span_objects is None:
+            self.span_objects = [None] * len(self.starts)
+        object_idx = idx if self.object_indices is None else self.object_indices[idx]
+        span = self.span_objects[object_idx]
+        if span is None:
+            span = self.span_objects[object_idx] = AnnoSpan(
+                self.starts[idx], self.ends[idx], self.doc,
+                self.label_names[self.label_ids[idx]])
+        return span
+
+    @property
+    def spans(self):
+        if self._spans is None:
+            self._spans = [self.span_at(idx) for idx in range(len(self.starts))]
+        return self._spans
+
+    @spans.setter
+    def spans(self, spans):
+        self._spans = spans
+        self.starts = self.ends = self.label_ids = None
+        self.span_objects = self.object_indices = None
+        self._array_index = None
+
+    def __len__(self):
+        if self.starts is None:
+            return len(self._spans)
+        return len(self.starts)
+
+    def __iter__(self):
+        if self.starts is None:
+            return iter(self._spans)
+        return (self.span_at(idx) for idx in range(len(self.starts)))
+
+    def __getitem__(self, idx):
+        if self.starts is None or isinstance(idx, slice):
+            return self.spans[idx]
+        if idx < 0:
+            idx += len(self.starts)
+        if not 0 <= idx < len(self.starts):
+            raise IndexError("tier index out of range")
+        return self.span_at(idx)
+
+    def _range_index(self):
+        if self.starts is None:
+            return super(ColumnarAnnoTier, self)._range_index()
+        index = getattr(self, '_array_index', None)
+        if index is None:
+            starts = self.starts
+            max_ends = []
+            max_end = None
+            ends_sorted = True
+            for end in self.ends:
+                if max_end is None or end >= max_end:
+                    max_end = end
+                else:
+                    ends_sorted = False
+                max_ends.append(max_end)
+            index = self._array_index = (starts, max_ends, ends_sorted)
+        return index
+
+    def group_spans_by_containing_span(self,
+                                       other_tier,
+                                       allow_partial_containment=False):
+        if self.starts is None:
+            return super(ColumnarAnnoTier, self).group_spans_by_containing_span(
+                other_tier, allow_partial_containment)
+        other_starts, other_ends, other_span_at = _offsets(other_tier)
+        return (
+            (self.span_at(idx), [other_span_at(other_idx) for other_idx in group])
+            for idx, group in _group_indices(
+                self.starts, self.ends, other_starts, other_ends,
+                allow_partial_containment))
+
+    def without_overlaps(self, other_tier):
+        if self.starts is None:
+            return super(ColumnarAnnoTier, self).without_overlaps(other_tier)
+        other_starts, other_ends, other_span_at = _offsets(other_tier)
+        return self._subset([
+            idx for idx, group in _group_indices(
+                self.starts, self.ends, other_starts, other_ends, True)
+            if len(group) == 0])
+
+    def optimal_span_set(self, prefer="text_length"):
+        if self.starts is None or prefer != "text_length":
+            return super(ColumnarAnnoTier, self).optimal_span_set(prefer)
+        starts = self.starts
+        ends = self.ends
+        indices = [
+            interval.corresponding_object
+            for interval in mwis.find_maximum_weight_interval_set([
+                mwis.Interval(
+                    start=starts[idx],
+                    end=ends[idx],
+                    weight=ends[idx] - starts[idx],
+                    corresponding_object=idx)
+                for idx in range(len(starts))])]
+        return self._subset(sorted(indices, key=lambda idx: (starts[idx], ends[idx])))
+
+    def with_following_spans_from(self, other_tier, max_dist=1, allow_overlap=False):
+        if self.starts is None:
+            return super(ColumnarAnnoTier, self).with_following_spans_from(
+                other_tier, max_dist, allow_overlap)
+        other_starts, other_ends, other_span_at = _offsets(other_tier)
+        starts = self.starts
+        extended_ends = [end + max_dist + 1 for end in self.ends]
+        result = []
+        for idx, group in _group_indices(
+                starts, extended_ends, other_starts, other_ends, True):
+            if allow_overlap:
+                start = starts[idx]
+                following = [
+                    other_idx for other_idx in group
+                    if start < other_starts[other_idx]]
+            else:
+                end = self.ends[idx]
+                following = [
+                    other_idx for other_idx in group
+                    if end <= other_starts[other_idx]]
+            # Like AnnoTier.with_following_spans_from the spans in the group
+            # from the first one that follows this span are included.
+            if following:
+                span = self.span_at(idx)
+                for other_idx in group[group.index(following[0]):]:
+                    result.append(span_pair(span, other_span_at(other_idx)))
+        return AnnoTier(result)
@@ -5,7 +5,7 @@ cumulative, case, death, age, hospitalization, approximate, min, max
 """
 from __future__ import absolute_import
 from .annotator import Annotator, AnnoTier, AnnoSpan
-from .spacy_annotator import SpacyAnnotator
+from .spacy_annotator import SpacyAnnotator, get_token_index
 from .date_annotator import DateAnnotator
 from .raw_number_annotator import RawNumberAnnotator
 from . import utils
@@ -66,31 +66,28 @@ class CountAnnotator(Annotator):
         spacy_nes = doc.tiers['spacy.nes']
         counts = doc.tiers['raw_numbers']
 
-        spacy_lemmas = [span.token.lemma_ for span in spacy_tokens]
+        token_index = get_token_index(spacy_tokens)
 
         def search_lemmas(lemmas, match_name=None):
-            match_spans = []
-            lemmas = set(lemmas)
-            for span, lemma in zip(spacy_tokens, spacy_lemmas):
-                if lemma in lemmas:
-                    match_spans.append(span)
-            return AnnoTier(match_spans, presorted=True).label_spans(match_name)
+            return token_index.search('lemma', lemmas, match_name)
 
         counts_tier = AnnoTier(AnnoSpan(count.start, count.end, doc, 'count')
                                for count in counts if is_valid_count(count.text))
+        age_tokens = token_index.search('lower', ['age'])
+        of_tokens = token_index.search('lower', ['of'])
+        distance_tokens, range_joiner_tokens = spacy_tokens.search_spans_multi([
+            'kilometers|km|miles|mi', r'to|and|or'])
         # Remove counts that overlap an age
         counts_tier = counts_tier.without_overlaps(
-            spacy_tokens.search_spans('age')
-            .with_following_spans_from(spacy_tokens.search_spans('of'))
+            age_tokens
+            .with_following_spans_from(of_tokens)
             .with_following_spans_from(counts_tier))
         # Remove distances
         counts_tier = counts_tier.without_overlaps(
-            counts_tier.with_following_spans_from(
-                spacy_tokens.search_spans('kilometers|km|miles|mi')))
+            counts_tier.with_following_spans_from(distance_tokens))
         # Add count ranges
         ranges = counts_tier.with_following_spans_from(
-            spacy_tokens
-            .search_spans(r'to|and|or')
+            range_joiner_tokens
             .with_following_spans_from(counts_tier)
             .label_spans('range'))
         counts_tier = (counts_tier + ranges).optimal_span_set()
@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 from __future__ import absolute_import
 from .annotator import Annotator, AnnoTier, AnnoSpan
-from .spacy_annotator import SpacyAnnotator
+from .annospan import SpanGroup, span_sort_key
+from .annotier import following_span_pairs, span_pair
+from .spacy_annotator import SpacyAnnotator, get_token_index
 from .structured_data_annotator import StructuredDataAnnotator
 from dateparser.date import DateDataParser
 from dateutil.relativedelta import relativedelta
@@ -58,6 +60,137 @@ extra_word_re = re.compile(
     r"((late|mid|early)\s)", re.I)
 
 
+# The number of parsed date ranges and date parsers kept for reuse.
+# The caches are cleared when they reach these sizes.
+DATE_RANGE_MEMO_SIZE = 20000
+DATE_PARSER_CACHE_SIZE = 100
+
+# Parsed date ranges keyed by the date text, relative base date, date
+# preference and document date. They are shared across documents unless
+# the document date is the current time.
+date_range_memo = {}
+date_parsers = {}
+
+
+def get_date_parser(relative_base, prefer_dates_from):
+    """
+    Return a date parser for the relative base date and date preference.
+    Parsers are reused rather than created for every date string.
+    """
+    key = (relative_base, prefer_dates_from)
+    parser = date_parsers.get(key)
+    if parser is None:
+        if len(date_parsers) >= DATE_PARSER_CACHE_SIZE:
+            date_parsers.clear()
+        parser = date_parsers[key] = DateDataParser(['en'], settings={
+            'RELATIVE_BASE': relative_base,
+            'PREFER_DATES_FROM': prefer_dates_from
+        })
+    return parser
+
+
+MONTH_NAMES = [
+    "january",
+    "february",
+    "march",
+    "april",
+    "may",
+    "june",
+    "july",
+    "august",
+    "september",
+    "october",
+    "november",
+    "december",
+]
+MONTH_NUMBERS = {}
+for month_number, month_name in enumerate(MONTH_NAMES, 1):
+    MONTH_NUMBERS[month_name] = month_number
+    MONTH_NUMBERS[month_name[:3]] = month_number
+MONTH_NUMBERS["sept"] = 9
+
+iso_date_re = re.compile(r"([0-9]{4})([\/\-])([0-9]{1,2})\2([0-9]{1,2})$")
+numeric_date_re = re.compile(r"([0-9]{1,2})([\/\-\.])([0-9]{1,2})\2([0-9]{4})$")
+day_month_year_re = re.compile(r"([0-9]{1,2}) ([a-z]{3,9}) ([0-9]{4})$", re.I)
+month_year_re = re.compile(r"([a-z]{3,9}) ([0-9]{4})$", re.I)
+year_re = re.compile(r"[0-9]{4}$")
+
+# Regex for formatted dates
+formatted_date_re = re.compile(
+    r"\b("
+    # parenthetical year
+    r"((?<=[\[\(])[1-2]\d{3}(?=[\]\)]))|"
+    # date MonthName yyyy
+    r"(\d{1,2} [a-zA-Z]{3,} \[?\d{4})|"
+    # dd-mm-yyyy
+    r"(\d{1,2} ?[\/\-] ?\d{1,2} ?[\/\-] ?\d{1,4})|"
+    # yyyy-MMM-dd
+    r"(\d{1,4} ?[\/\-] ?[a-z]{3,4} ?[\/\-] ?\d{1,4})|"
+    # yyyy-mm-dd
+    r"(\d{1,4} ?[\/\-] ?\d{1,2} ?[\/\-] ?\d{1,2})"
+    r")\b", re.I)
+year_component_re = re.compile(r"([1-2]\d{3})")
+age_re = re.compile(r"\bage\b")
+
+
+def period_datetime_range(date, period):
+    """
+    Return the datetime range of the day, month or year containing the date.
+    """
+    if period == 'day':
+        return [date, date + relativedelta(days=1)]
+    elif period == 'month':
+        date = datetime.datetime(date.year, date.month, 1)
+        return [date, date + relativedelta(months=1)]
+    elif period == 'year':
+        date = datetime.datetime(date.year, 1, 1)
+        return [date, date + relativedelta(years=1)]
+
+
+def parse_simple_date(text):
+    """
+    Parse dates in a few common formats that don't need dateparser's
+    language and relative date handling into the same datetime ranges
+    dateparser would produce. None is returned for other dates.
+    """
+    try:
+        match = iso_date_re.match(text)
+        if match:
+            return period_datetime_range(datetime.datetime(
+                int(match.group(1)), int(match.group(3)), int(match.group(4))), 'day')
+        match = numeric_date_re.match(text)
+        if match:
+            first = int(match.group(1))
+            second = int(match.group(3))
+            # Like dateparser, month first dates are preferred unless the
+            # first number can't be a month.
+            if first <= 12:
+                month, day = first, second
+            else:
+                day, month = first, second
+            return period_datetime_range(datetime.datetime(
+                int(match.group(4)), month, day), 'day')
+        match = day_month_year_re.match(text)
+        if match:
+            month = MONTH_NUMBERS.get(match.group(2).lower())
+            if month:
+                return period_datetime_range(datetime.datetime(
+                    int(match.group(3)), month, int(match.group(1))), 'day')
+            return None
+        match = month_year_re.match(text)
+        if match:
+            month = MONTH_NUMBERS.get(match.group(1).lower())
+            if month:
+                return period_datetime_range(datetime.datetime(
+                    int(match.group(2)), month, 1), 'month')
+            return None
+        if year_re.match(text):
+            return period_datetime_range(datetime.datetime(int(text), 1, 1), 'year')
+    except ValueError:
+        # Invalid dates like February 31st are left to dateparser.
+        return None
+
+
 def clean_date_str(text):
     # strip extra words from the beginning of the date string
     text = extra_word_re.sub("", text, re.I)
@@ -66,6 +199,83 @@ def clean_date_str(text):
     return text.strip()
 
 
+def date_candidates(doc, token_index):
+    """
+    Find the spans that could be dates in the document. Return a tier of
+    the date spans, and lists of the date ranges formed by two date spans
+    with a joiner word between them, and of the date spans following or
+    containing "since".
+
+    The candidates are the same as the ones the AnnoTier combinators
+    would create, but they are generated from sorted span lists in a few
+    passes. Span groups are only created for the spans that end up in a
+    candidate, rather than for every date span at each step.
+    """
+    # Combine the nes and regex dates, and add year components individually
+    # incase the full spans are thrown out. Sometimes extra text is added to
+    # dates that makes them invalid, this allows some of the date to be
+    # recovered.
+    date_spans = sorted(
+        [span for span in doc.tiers['spacy.nes'] if span.label == 'DATE'] +
+        doc.create_regex_tier(formatted_date_re).spans,
+        key=span_sort_key)
+    text = doc.text
+    year_spans = [
+        AnnoSpan(match.start(), match.end(), doc)
+        for span in date_spans
+        for match in year_component_re.finditer(text, span.start, span.end)]
+    date_spans = sorted(date_spans + year_spans, key=span_sort_key)
+    date_span_tier = AnnoTier(date_spans, presorted=True)
+    # Remove spans that are probably ages.
+    age_spans = [
+        AnnoSpan(match.start() + span.start, match.end() + span.start, doc)
+        for span in date_spans
+        for match in age_re.finditer(span.text)]
+    if age_spans:
+        date_span_tier = date_span_tier.without_overlaps(
+            AnnoTier(age_spans, presorted=True))
+        date_spans = date_span_tier.spans
+
+    # Find date ranges by looking for joiner words between dates.
+    # Each date span has one labeled group for each side of a range.
+    start_groups = {}
+    end_groups = {}
+
+    def labeled_group(groups, span, label):
+        group = groups.get(id(span))
+        if group is None:
+            group = groups[id(span)] = SpanGroup.from_bounds(
+                [span], span.start, span.end, label)
+        return group
+    date_range_joiners = token_index.spans_with(
+        'lower', DATE_RANGE_JOINERS.split('|') + ['-'])
+    start_joiner_pairs = sorted([
+        span_pair(labeled_group(start_groups, span, 'start'), joiner)
+        for span, joiner in following_span_pairs(
+            date_spans, date_range_joiners, 3, False)], key=span_sort_key)
+    date_ranges = sorted([
+        span_pair(pair, labeled_group(end_groups, span, 'end'))
+        for pair, span in following_span_pairs(
+            start_joiner_pairs, date_spans, 3, False)], key=span_sort_key)
+    date_ranges = [
+        SpanGroup.from_bounds([span], span.start, span.end, 'date_range')
+        for span in date_ranges]
+
+    since_tokens = token_index.search('lemma', ['since'], 'since_token')
+    since_dates = []
+    if len(since_tokens) > 0:
+        since_dates = [
+            span_pair(token, span)
+            for token, span in following_span_pairs(
+                since_tokens.spans, date_spans, 1, True)]
+        for span, tokens in date_span_tier.group_spans_by_containing_span(since_tokens):
+            since_dates += [span_pair(span, token) for token in tokens]
+        since_dates = [
+            SpanGroup.from_bounds([span], span.start, span.end, 'since_date')
+            for span in sorted(since_dates, key=span_sort_key)]
+    return date_span_tier, date_ranges, since_dates
+
+
 class DateSpan(AnnoSpan):
     def __init__(self, base_span, datetime_range):
         super(DateSpan, self).__init__(
@@ -115,15 +325,50 @@ class DateAnnotator(Annotator):
         # be treated as the most recent date explicitly mentioned in the
         # the document.
         detect_date = doc.date is None
-        doc_date = doc.date or datetime.datetime.now()
+        current_date = datetime.datetime.now()
+        doc_date = doc.date or current_date
         strict_parser = DateDataParser(['en'], settings={
             'STRICT_PARSING': True})
+        # Ranges parsed relative to the current time are only reused within
+        # this document.
+        current_date_range_memo = {}
+        strict_date_memo = {}
 
         def date_to_datetime_range(text,
                                    relative_base=None,
                                    prefer_dates_from='past'):
             if relative_base is None:
                 relative_base = doc_date
+            # Ranges are memoized with the document date because the
+            # components of relative and ordinal dates are parsed relative
+            # to it.
+            key = (text, relative_base, prefer_dates_from, doc_date)
+            if doc_date is current_date:
+                memo = current_date_range_memo
+            else:
+                memo = date_range_memo
+            if key in memo:
+                result = memo[key]
+            else:
+                result = parse_datetime_range(
+                    text, relative_base, prefer_dates_from)
+                if len(memo) >= DATE_RANGE_MEMO_SIZE:
+                    memo.clear()
+                memo[key] = result
+            if result:
+                return list(result)
+            return result
+
+        def strict_date(text):
+            # Unparsable dates are treated as if no date was found.
+            if text not in strict_date_memo:
+                try:
+                    strict_date_memo[text] = strict_parser.get_date_data(text)['date_obj']
+                except (TypeError, ValueError):
+                    strict_date_memo[text] = None
+            return strict_date_memo[text]
+
+        def parse_datetime_range(text, relative_base, prefer_dates_from):
             # Handle relative date ranges like "the past ___ days"
             relative_num_days = re.sub(relative_duration_range_re, "", text)
             if len(relative_num_days) < len(text):
@@ -180,25 +425,18 @@ class DateAnnotator(Annotator):
                 decade = int(decade_match.groups()[0])
                 return [datetime.datetime(decade, 1, 1),
                         datetime.datetime(decade + 10, 1, 1)]
-            parser = DateDataParser(['en'], settings={
-                'RELATIVE_BASE': relative_base or datetime.datetime.now(),
-                'PREFER_DATES_FROM': prefer_dates_from
-            })
+            text = re.sub(r" year$", "", text)
+            simple_date_range = parse_simple_date(text)
+            if simple_date_range:
+                return simple_date_range
+            parser = get_date_parser(relative_base, prefer_dates_from)
             try:
-                text = re.sub(r" year$", "", text)
                 date_data = parser.get_date_data(text)
             except (TypeError, ValueError):
                 return
             if date_data['date_obj']:
-                date = date_data['date_obj']
-                if date_data['period'] == 'day':
-                    return [date, date + relativedelta(days=1)]
-                elif date_data['period'] == 'month':
-                    date = datetime.datetime(date.year, date.month, 1)
-                    return [date, date + relativedelta(months=1)]
-                elif date_data['period'] == 'year':
-                    date = datetime.datetime(date.year, 1, 1)
-                    return [date, date + relativedelta(years=1)]
+                return period_datetime_range(
+                    date_data['date_obj'], date_data['period'])
 
         def parse_non_relative_date(text):
             result = date_to_datetime_range(
@@ -212,31 +450,8 @@ class DateAnnotator(Annotator):
             doc.add_tiers(StructuredDataAnnotator())
         if 'spacy.nes' not in doc.tiers:
             doc.add_tiers(SpacyAnnotator())
-        # Create a combine tier of nes and regex dates
-        date_span_tier = doc.tiers['spacy.nes'].with_label('DATE')
-        # Regex for formatted dates
-        regex = re.compile(
-            r"\b("
-            # parenthetical year
-            r"((?<=[\[\(])[1-2]\d{3}(?=[\]\)]))|"
-            # date MonthName yyyy
-            r"(\d{1,2} [a-zA-Z]{3,} \[?\d{4})|"
-            # dd-mm-yyyy
-            r"(\d{1,2} ?[\/\-] ?\d{1,2} ?[\/\-] ?\d{1,4})|"
-            # yyyy-MMM-dd
-            r"(\d{1,4} ?[\/\-] ?[a-z]{3,4} ?[\/\-] ?\d{1,4})|"
-            # yyyy-mm-dd
-            r"(\d{1,4} ?[\/\-] ?\d{1,2} ?[\/\-] ?\d{1,2})"
-            r")\b", re.I)
-        match_tier = doc.create_regex_tier(regex)
-        date_span_tier += match_tier
-        # Add year components individually incase the full spans are thrown out.
-        # Sometimes extra text is added to dates that makes them invalid,
-        # this allows some of the date to be recovered.
-        date_span_tier += date_span_tier.match_subspans(r"([1-2]\d{3})")
-        # Remove spans that are probably ages.
-        date_span_tier = date_span_tier.without_overlaps(
-            date_span_tier.match_subspans(r"\bage\b"))
+        date_span_tier, date_ranges, since_dates = date_candidates(
+            doc, get_token_index(doc.tiers['spacy.tokens']))
         # Group adjacent date info in case it is parsed as separate chunks.
         # ex: Friday, October 7th 2010.
         adjacent_date_spans = date_span_tier.combined_adjacent_spans(max_dist=9)
@@ -246,49 +461,31 @@ class DateAnnotator(Annotator):
             if re.match(r"\d{4}", text, re.I):
                 # year only date
                 return True
-            try:
-                return strict_parser.get_date_data(text)['date_obj'] is None
-            except (TypeError, ValueError):
-                return True
+            return strict_date(text) is None
         for date_group in adjacent_date_spans:
             date_group_spans = list(date_group.iterate_leaf_base_spans())
             if any(can_combine(span.text) for span in date_group_spans):
                 if date_to_datetime_range(date_group.text) is not None:
                     grouped_date_spans.append(date_group)
-        # Find date ranges by looking for joiner words between dates.
-        date_range_joiners = [
-            t_span for t_span in doc.tiers['spacy.tokens']
-            if re.match(r"(" + DATE_RANGE_JOINERS + r"|\-)$", t_span.text, re.I)]
-        date_range_tier = date_span_tier.label_spans('start')\
-            .with_following_spans_from(date_range_joiners, max_dist=3)\
-            .with_following_spans_from(date_span_tier.label_spans('end'), max_dist=3)\
-            .label_spans('date_range')
-        since_tokens = AnnoTier([
-            t_span for t_span in doc.tiers['spacy.tokens']
-            if 'since' == t_span.token.lemma_], presorted=True).label_spans('since_token')
-        since_date_tier = (
-            since_tokens.with_following_spans_from(date_span_tier, allow_overlap=True) +
-            date_span_tier.with_contained_spans_from(since_tokens)
-        ).label_spans('since_date')
         tier_spans = []
         all_date_spans = AnnoTier(
-            date_range_tier.spans +
+            date_ranges +
             grouped_date_spans +
             date_span_tier.spans +
-            since_date_tier.spans)
+            since_dates)
 
         if detect_date:
             simple_date_spans = AnnoTier(
                 grouped_date_spans +
                 date_span_tier.spans).optimal_span_set(prefer='text_length')
-            latest_date = None
+            # The latest date mentioned in earlier windows of a streamed
+            # document is carried over in its context.
+            context = doc.context
+            latest_date = context.get('latest_date') if context is not None else None
             for span in simple_date_spans:
                 if re.match(r"today|yesterday", span.text, re.I):
                     continue
-                try:
-                    span_date = strict_parser.get_date_data(span.text)['date_obj']
-                except (TypeError, ValueError):
-                    continue
+                span_date = strict_date(span.text)
                 if span_date:
                     timezone_span = span_date.tzinfo
                     if span_date < datetime.datetime.now(timezone_span):
@@ -296,6 +493,8 @@ class DateAnnotator(Annotator):
                             latest_date = span_date
             if latest_date:
                 doc_date = latest_date
+                if context is not None:
+                    context['latest_date'] = latest_date
 
         date_spans_without_structured_data = all_date_spans.without_overlaps(doc.tiers['structured_data'])
         date_spans_in_structured_data = []
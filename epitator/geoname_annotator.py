@@ -4,10 +4,12 @@ from __future__ import absolute_import
 import math
 import re
 import sqlite3
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
 
 from .annotator import Annotator, AnnoTier, AnnoSpan
-from .ngram_annotator import NgramAnnotator
+from .ngram_annotator import NgramAnnotator, NgramTier
+from .name_filter import FirstWordFilter
 from .ne_annotator import NEAnnotator
 from .spacy_annotator import SpacyAnnotator
 from geopy.distance import great_circle
@@ -109,6 +111,9 @@ class GeoSpan(AnnoSpan):
         return result
 
 
+# Shared by all the candidate geonames that have no related geonames.
+EMPTY_TUPLE = ()
+
 GEONAME_ATTRS = [
     'geonameid',
     'name',
@@ -134,34 +139,15 @@ ADMINNAME_ATTRS = [
     'admin3_name']
 
 
-class GeonameRow(object):
-    __slots__ = GEONAME_ATTRS + ADMINNAME_ATTRS + [
-        'alternate_locations',
-        'overlapping_locations',
-        'spans',
-        'original_spans',
-        'parents',
-        'score',
-        'lat_long',
-        'high_confidence',
-        'base_score']
-
-    def __init__(self, sqlite3_row):
-        for key in sqlite3_row.keys():
-            if key in GEONAME_ATTRS:
-                setattr(self, key, sqlite3_row[key])
-        self.lat_long = (self.latitude, self.longitude,)
-        self.alternate_locations = set()
-        self.overlapping_locations = set()
-        self.spans = set()
-        self.original_spans = set()
-        self.parents = set()
-        self.score = None
-
-    def add_spans(self, span_text_to_spans):
-        for name in set(self.lemmas_used.split(';')):
-            for span in span_text_to_spans[name]:
-                self.spans.add(span)
+class Geoname(object):
+    """
+    The methods shared by candidate and resolved geonames.
+    """
+    __slots__ = []
+
+    @property
+    def lat_long(self):
+        return (self.latitude, self.longitude,)
 
     def __hash__(self):
         return id(self)
@@ -184,6 +170,270 @@ class GeonameRow(object):
         return result
 
 
+class GeonameRow(Geoname):
+    """
+    A view of a single candidate geoname stored in a GeonameCandidates arena.
+    Database attributes are read from the arena's columns and the related
+    spans and geonames are read from its index lists.
+    """
+    __slots__ = ['candidates', 'idx']
+
+    def __init__(self, candidates, idx):
+        self.candidates = candidates
+        self.idx = idx
+
+    @property
+    def spans(self):
+        candidate_spans = self.candidates.spans
+        return [candidate_spans[span_id]
+                for span_id in self.candidates.span_ids[self.idx]]
+
+    @property
+    def original_spans(self):
+        candidate_spans = self.candidates.spans
+        return frozenset(candidate_spans[span_id]
+                         for span_id in self.candidates.original_span_ids[self.idx])
+
+    @property
+    def parents(self):
+        return self.candidates.rows_for(self.candidates.parent_ids[self.idx])
+
+    @property
+    def alternate_locations(self):
+        return self.candidates.rows_for(self.candidates.alternates_of(self.idx))
+
+    @property
+    def overlapping_locations(self):
+        return self.candidates.rows_for(self.candidates.overlapping_of(self.idx))
+
+    @property
+    def base_score(self):
+        return self.candidates.columns['base_score'][self.idx]
+
+    @base_score.setter
+    def base_score(self, value):
+        self.candidates.columns['base_score'][self.idx] = value
+        # The best scores in each overlap range depend on the base scores.
+        self.candidates.span_best_scores = None
+
+
+def _column_property(key):
+    def getter(self):
+        return self.candidates.columns[key][self.idx]
+
+    def setter(self, value):
+        self.candidates.columns[key][self.idx] = value
+    return property(getter, setter)
+
+
+def _sparse_property(key):
+    def getter(self):
+        try:
+            return self.candidates.sparse_columns[key][self.idx]
+        except KeyError:
+            raise AttributeError(key)
+
+    def setter(self, value):
+        self.candidates.sparse_columns[key][self.idx] = value
+    return property(getter, setter)
+
+
+for _key in GEONAME_ATTRS + ['score', 'high_confidence']:
+    setattr(GeonameRow, _key, _column_property(_key))
+# Admin names are only looked up for the geonames that pass the score
+# threshold, so they are stored sparsely.
+for _key in ADMINNAME_ATTRS:
+    setattr(GeonameRow, _key, _sparse_property(_key))
+
+
+class ResolvedGeoname(Geoname):
+    """
+    A geoname that spans were resolved to. Its attributes, spans and parents
+    are copied from the candidate it was chosen from, so the GeonameCandidates
+    arena and the other candidates can be freed once annotation is done.
+    """
+    __slots__ = GEONAME_ATTRS + ADMINNAME_ATTRS + [
+        'score',
+        'base_score',
+        'high_confidence',
+        'spans',
+        'original_spans',
+        'parents']
+
+
+def resolve_geonames(rows):
+    """
+    Copy the candidate geonames into ResolvedGeonames along with the
+    candidates that are their parents. The rows must be from the same arena.
+    """
+    resolved = {}
+
+    def resolve(row):
+        result = resolved.get(row.idx)
+        if result is None:
+            candidates = row.candidates
+            idx = row.idx
+            result = resolved[idx] = ResolvedGeoname()
+            for key in GEONAME_ATTRS + ['score', 'base_score', 'high_confidence']:
+                setattr(result, key, candidates.columns[key][idx])
+            for key in ADMINNAME_ATTRS:
+                if idx in candidates.sparse_columns[key]:
+                    setattr(result, key, candidates.sparse_columns[key][idx])
+            result.spans = tuple(row.spans)
+            result.original_spans = row.original_spans
+            # The result is stored before its parents are resolved in case
+            # they refer back to it.
+            result.parents = set(resolve(parent) for parent in row.parents)
+        return result
+    return [resolve(row) for row in rows]
+
+
+class GeonameCandidates(object):
+    """
+    Compact per-document storage for candidate geonames.
+    Static geoname attributes are kept in parallel lists indexed by candidate,
+    and the spans and geonames related to each candidate are kept as lists of
+    integer indices. Database rows that do not match any span never get an
+    entry, and candidates without relations share a single empty tuple.
+    """
+    def __init__(self, sqlite3_rows, span_text_to_spans):
+        self.columns = {key: [] for key in GEONAME_ATTRS}
+        self.sparse_columns = {key: {} for key in ADMINNAME_ATTRS}
+        # The span table. Candidates refer to spans by their index in it.
+        self.spans = []
+        self.span_to_id = {}
+        self.span_ids = []
+        self.original_span_ids = []
+        for row in sqlite3_rows:
+            span_ids = set()
+            for name in set(row['lemmas_used'].split(';')):
+                for span in span_text_to_spans.get(name, EMPTY_TUPLE):
+                    span_ids.add(self.get_span_id(span))
+            # In rare cases geonames may have no matching spans because
+            # sqlite unicode equivalency rules match geonames that use different
+            # characters the document spans used to query them.
+            # These geonames are ignored.
+            if len(span_ids) == 0:
+                continue
+            for key in GEONAME_ATTRS:
+                self.columns[key].append(row[key])
+            span_ids = tuple(sorted(span_ids))
+            self.span_ids.append(span_ids)
+            self.original_span_ids.append(span_ids)
+        size = len(self.span_ids)
+        for key in ['score', 'base_score', 'high_confidence']:
+            self.columns[key] = [None] * size
+        self.parent_ids = [EMPTY_TUPLE] * size
+        self.rows = [GeonameRow(self, idx) for idx in range(size)]
+        self.span_geonames = {}
+        self.overlap_ranges = {}
+        self.sweep_order = []
+        self.span_best_scores = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get_span_id(self, span):
+        span_id = self.span_to_id.get(span)
+        if span_id is None:
+            span_id = len(self.spans)
+            self.span_to_id[span] = span_id
+            self.spans.append(span)
+        return span_id
+
+    def rows_for(self, ids):
+        rows = self.rows
+        return set(rows[idx] for idx in ids)
+
+    def geonames_by_span_id(self):
+        """
+        Return a dict mapping the ids of the spans currently associated with
+        candidates to the indices of those candidates.
+        """
+        result = defaultdict(list)
+        for idx, span_ids in enumerate(self.span_ids):
+            for span_id in span_ids:
+                result[span_id].append(idx)
+        return result
+
+    def index_overlaps(self):
+        """
+        Group the candidates by the spans they are currently associated with.
+        Candidates that share a span are alternate locations.
+        A sweep over the spans in offset order assigns each one a range of
+        positions in that order that covers the spans overlapping it,
+        so overlapping locations are the candidates of the spans in the range.
+        """
+        spans = self.spans
+        self.span_geonames = self.geonames_by_span_id()
+        self.sweep_order = sorted(
+            self.span_geonames.keys(),
+            key=lambda span_id: (spans[span_id].start, spans[span_id].end))
+        starts = []
+        max_ends = []
+        max_end = None
+        for span_id in self.sweep_order:
+            span = spans[span_id]
+            if max_end is None or span.end > max_end:
+                max_end = span.end
+            starts.append(span.start)
+            max_ends.append(max_end)
+        # A range begins at the first span that extends past the start of
+        # the given span and stops before the first span starting after its end.
+        self.overlap_ranges = {
+            span_id: (bisect_right(max_ends, spans[span_id].start),
+                      bisect_left(starts, spans[span_id].end))
+            for span_id in self.sweep_order}
+        self.span_best_scores = None
+
+    def alternates_of(self, idx):
+        result = set()
+        for span_id in self.span_ids[idx]:
+            result.update(self.span_geonames[span_id])
+        result.discard(idx)
+        return result
+
+    def count_alternates(self, idx):
+        span_ids = self.span_ids[idx]
+        if len(span_ids) == 1:
+            return len(self.span_geonames[span_ids[0]]) - 1
+        return len(self.alternates_of(idx))
+
+    def overlapping_of(self, idx):
+        result = set()
+        for span_id in self.span_ids[idx]:
+            range_start, range_end = self.overlap_ranges[span_id]
+            for overlapping_span_id in self.sweep_order[range_start:range_end]:
+                result.update(self.span_geonames[overlapping_span_id])
+        result.discard(idx)
+        return result
+
+    def greatest_overlapping_score(self, idx):
+        """
+        Return the greatest base score among the candidates overlapping the
+        one at the given index, or 0 if there are none.
+        """
+        if self.span_best_scores is None:
+            # Keep the two best candidates for each span so the candidate
+            # being scored can be skipped without scanning the others.
+            base_scores = self.columns['base_score']
+            self.span_best_scores = {}
+            for span_id, geoname_idxs in self.span_geonames.items():
+                best = sorted(geoname_idxs, key=lambda i: -base_scores[i])[:2]
+                self.span_best_scores[span_id] = [
+                    (i, base_scores[i]) for i in best]
+        greatest_overlapping_score = 0.0
+        for span_id in self.span_ids[idx]:
+            range_start, range_end = self.overlap_ranges[span_id]
+            for overlapping_span_id in self.sweep_order[range_start:range_end]:
+                for other_idx, score in self.span_best_scores[overlapping_span_id]:
+                    if other_idx != idx:
+                        if score > greatest_overlapping_score:
+                            greatest_overlapping_score = score
+                        break
+        return greatest_overlapping_score
+
+
 class GeonameFeatures(object):
     """
     This represents the aspects of a condidate geoname that are used to
@@ -234,32 +484,35 @@ class GeonameFeatures(object):
         d['name_count'] = math.log(geoname.name_count)
         names_used = geoname.names_used.split(';')
         d['names_used'] = math.log(len(names_used))
+        geoname_spans = geoname.spans
+        # Spans are shared by the alternate geonames for them so their texts
+        # are read from the document's slice cache.
+        span_texts = [
+            span.doc.text_slice(span.start, span.end) for span in geoname_spans]
         for name in names_used:
-            for span in geoname.spans:
-                if span.text == name:
-                    d['exact_name_match'] = 1.0
-                    break
-        d['multiple_spans'] = 1 if len(geoname.spans) > 1 else 0
+            if name in span_texts:
+                d['exact_name_match'] = 1.0
+        d['multiple_spans'] = 1 if len(geoname_spans) > 1 else 0
         d['span_length'] = median([
-            len(span.text) for span in geoname.spans])
-        d['all_acronyms'] = max(len(span.text.replace('.', '')) for span in geoname.spans) < 4
+            len(span_text) for span_text in span_texts])
+        d['all_acronyms'] = max(len(span_text.replace('.', '')) for span_text in span_texts) < 4
 
         def cannonical_name_match(span, geoname):
             first_leaf = next(span.iterate_leaf_base_spans(), None)
             if first_leaf:
-                span_text = first_leaf.text
+                span_text = first_leaf.doc.text_slice(first_leaf.start, first_leaf.end)
             else:
-                span_text = span.text
+                span_text = span.doc.text_slice(span.start, span.end)
             span_in_name = span_text in geoname.name or span_text in geoname.asciiname
             return (float(len(span_text)) if span_in_name else 0) / len(geoname.name)
         d['cannonical_name_used'] = max([
             cannonical_name_match(span, geoname)
-            for span in geoname.spans
+            for span in geoname_spans
         ])
         loc_NEs_overlap = 0
         other_NEs_overlap = 0
-        total_spans = len(geoname.spans)
-        for span in geoname.spans:
+        total_spans = len(geoname_spans)
+        for span in geoname_spans:
             for ne_span in spans_to_nes[span]:
                 if ne_span.label == 'GPE' or ne_span.label == 'LOC':
                     loc_NEs_overlap += 1
@@ -271,7 +524,7 @@ class GeonameFeatures(object):
         other_pos_portions = []
         token_lens = []
         token_probs = []
-        for span in geoname.spans:
+        for span in geoname_spans:
             noun_pos_tags = 0
             other_pos_tags = 0
             pos_tags = 0
@@ -286,11 +539,12 @@ class GeonameFeatures(object):
             noun_portions.append(float(noun_pos_tags) / pos_tags)
             other_pos_portions.append(float(other_pos_tags) / pos_tags)
             token_lens.append(pos_tags)
-        d['combined_span'] = 1 if len(geoname.parents) > 0 else 0
+        candidates = geoname.candidates
+        d['combined_span'] = 1 if len(candidates.parent_ids[geoname.idx]) > 0 else 0
         d['noun_portion'] = median(noun_portions)
         d['num_tokens'] = median(token_lens)
         d['med_token_prob'] = median(token_probs)
-        d['exact_alternatives'] = math.log(len(geoname.alternate_locations) + 1)
+        d['exact_alternatives'] = math.log(candidates.count_alternates(geoname.idx) + 1)
         feature_code = geoname.feature_code
         if feature_code.startswith('PPL'):
             d['PPL_feature_code'] = 1
@@ -338,10 +592,7 @@ class GeonameFeatures(object):
                 close_locations += 1
             if distance < 100:
                 very_close_locations += 1
-        greatest_overlapping_score = 0.0
-        for location in geoname.overlapping_locations:
-            if location.base_score > greatest_overlapping_score:
-                greatest_overlapping_score = location.base_score
+        greatest_overlapping_score = geoname.candidates.greatest_overlapping_score(geoname.idx)
         self.set_values(dict(
             close_locations=close_locations,
             very_close_locations=very_close_locations,
@@ -368,6 +619,9 @@ class GeonameAnnotator(Annotator):
             self.geoname_classifier = custom_classifier
         else:
             self.geoname_classifier = geoname_classifier
+        # A filter of the first words of the alternatenames
+        self.name_filter = FirstWordFilter(
+            self.connection, 'alternatenames', 'alternatename_lemmatized')
 
     def get_candidate_geonames(self, doc):
         """
@@ -418,17 +672,34 @@ class GeonameAnnotator(Annotator):
             "E ": "East ",
             "W ": "West "
         }
-        for span, tokens in all_ngrams.group_spans_by_containing_span(tokens):
+        if isinstance(all_ngrams, NgramTier) and all_ngrams.token_spans is tokens.spans:
+            ngram_spans = all_ngrams.ngrams()
+        else:
+            ngram_spans = (
+                (span.start, span.end, span_tokens)
+                for span, span_tokens in all_ngrams.group_spans_by_containing_span(tokens))
+        name_filter = self.name_filter
+
+        def could_match(text):
+            # Directions are kept because they are extended below.
+            return name_filter.could_match(text) or lower_case_direction.match(text)
+
+        for start, end, ngram_tokens in ngram_spans:
             # Replace non-standard apostrophes
-            text = span.text.replace('\u2019', "'")
-            if is_possible_geoname(text, tokens):
+            text = doc.text[start:end].replace('\u2019', "'")
+            if is_possible_geoname(text, ngram_tokens):
                 text = normalize_text(text)
                 if is_possible_geoname_text(text):
+                    span_texts = []
                     for trigger, expansion in expansions.items():
                         if text.startswith(trigger):
-                            expanded_text = text.replace(trigger, expansion, 1).lower()
-                            span_text_to_spans[expanded_text].append(span)
-                    span_text_to_spans[text.lower()].append(span)
+                            span_texts.append(text.replace(trigger, expansion, 1).lower())
+                    span_texts.append(text.lower())
+                    span_texts = [span_text for span_text in span_texts if could_match(span_text)]
+                    if span_texts:
+                        span = AnnoSpan(start, end, doc)
+                        for span_text in span_texts:
+                            span_text_to_spans[span_text].append(span)
         # Add dehyphenated variants and extended directions.
         for span_text, spans in list(span_text_to_spans.items()):
             if lower_case_direction.match(span_text):
@@ -437,7 +708,9 @@ class GeonameAnnotator(Annotator):
         possible_geonames_escaped = [x.replace("'", "''") if "'" in x else x for x in possible_geonames]
         logger.info('%s possible geoname texts' % len(possible_geonames))
         cursor = self.connection.cursor()
-        geoname_results = list(cursor.execute('''
+        # The rows are consumed directly from the cursor so only the ones
+        # matching a span are kept in memory.
+        geoname_results = cursor.execute('''
         SELECT
             geonames.*,
             count AS name_count,
@@ -447,77 +720,55 @@ class GeonameAnnotator(Annotator):
         JOIN alternatename_counts USING ( geonameid )
         JOIN alternatenames USING ( geonameid )
         WHERE alternatename_lemmatized IN (''' + ','.join("'{0}'".format(x) for x in possible_geonames_escaped) + ''')
-        GROUP BY geonameid'''))
-        logger.info('%s geonames fetched' % len(geoname_results))
-        geoname_results = [GeonameRow(g) for g in geoname_results]
-        candidate_geonames = []
-        for geoname in geoname_results:
-            geoname.add_spans(span_text_to_spans)
-            geoname.original_spans = set(geoname.spans)
-            # In rare cases geonames may have no matching spans because
-            # sqlite unicode equivalency rules match geonames that use different
-            # characters the document spans used to query them.
-            # These geonames are ignored.
-            if len(geoname.spans) > 0:
-                candidate_geonames.append(geoname)
+        GROUP BY geonameid''')
+        candidates = GeonameCandidates(geoname_results, span_text_to_spans)
+        logger.info('%s geonames fetched' % len(candidates))
+        candidate_spans = candidates.spans
         # Add combined spans to locations that are adjacent to a span linked to
         # an administrative division. e.g. Seattle, WA
-        span_to_geonames = defaultdict(list)
-        for geoname in candidate_geonames:
-            for span in geoname.spans:
-                span_to_geonames[span].append(geoname)
-        geoname_spans = span_to_geonames.keys()
+        span_id_to_geonames = candidates.geonames_by_span_id()
+        geoname_spans = [candidate_spans[span_id] for span_id in span_id_to_geonames.keys()]
         combined_spans = AnnoTier(geoname_spans).chains(at_least=2, at_most=4, max_dist=4).label_spans('combined_span')
         for combined_span in combined_spans:
             leaf_spans = combined_span.iterate_leaf_base_spans()
             first_spans = next(leaf_spans)
-            potential_geonames = {geoname: set()
-                                  for geoname in span_to_geonames[first_spans]}
+            potential_geonames = {idx: set()
+                                  for idx in span_id_to_geonames[candidates.span_to_id[first_spans]]}
             for leaf_span in leaf_spans:
-                leaf_span_geonames = span_to_geonames[leaf_span]
+                leaf_span_geonames = span_id_to_geonames[candidates.span_to_id[leaf_span]]
                 next_potential_geonames = defaultdict(set)
-                for potential_geoname, prev_containing_geonames in potential_geonames.items():
+                for potential_idx, prev_containing_geonames in potential_geonames.items():
+                    potential_geoname = candidates.rows[potential_idx]
                     containing_geonames = [
-                        containing_geoname
-                        for containing_geoname in leaf_span_geonames
-                        if location_contains(containing_geoname, potential_geoname) > 0]
+                        containing_idx
+                        for containing_idx in leaf_span_geonames
+                        if location_contains(candidates.rows[containing_idx], potential_geoname) > 0]
                     if len(containing_geonames) > 0:
-                        next_potential_geonames[potential_geoname] |= prev_containing_geonames | set(containing_geonames)
+                        next_potential_geonames[potential_idx] |= prev_containing_geonames | set(containing_geonames)
                 potential_geonames = next_potential_geonames
-            for geoname, containing_geonames in potential_geonames.items():
-                geoname.spans.add(combined_span)
-                geoname.parents |= containing_geonames
+            if len(potential_geonames) == 0:
+                continue
+            combined_span_id = candidates.get_span_id(combined_span)
+            for idx, containing_geonames in potential_geonames.items():
+                candidates.span_ids[idx] += (combined_span_id,)
+                candidates.parent_ids[idx] = tuple(sorted(
+                    set(candidates.parent_ids[idx]) | containing_geonames))
         # Replace individual spans with combined spans.
-        span_to_geonames = defaultdict(list)
-        for geoname in candidate_geonames:
-            geoname.spans = set(AnnoTier(geoname.spans).optimal_span_set().spans)
-            for span in geoname.spans:
-                span_to_geonames[span].append(geoname)
+        for idx, span_ids in enumerate(candidates.span_ids):
+            if len(span_ids) > 1:
+                candidates.span_ids[idx] = tuple(sorted(
+                    candidates.span_to_id[span]
+                    for span in AnnoTier([candidate_spans[span_id] for span_id in span_ids]).optimal_span_set()))
         # Find locations with overlapping spans
         # Note that is is possible for two valid locations to have
         # overlapping names. For example, Harare Province has
         # Harare as an alternate name, so the city Harare is very
         # likely to be an alternate location that competes with it.
-        for span, geonames in span_to_geonames.items():
-            geoname_set = set(geonames)
-            for geoname in geonames:
-                geoname.alternate_locations |= geoname_set
-        possible_geoname_tier = AnnoTier([
-            AnnoSpan(span.start, span.end, span.doc, metadata=set(geonames))
-            for span, geonames in span_to_geonames.items()])
-        grouped_possible_geonames = possible_geoname_tier.group_spans_by_containing_span(
-            possible_geoname_tier,
-            allow_partial_containment=True)
-        for outer_span, overlapping_spans in grouped_possible_geonames:
-            for geoname in outer_span.metadata:
-                for overlapping_span in overlapping_spans:
-                    geoname.overlapping_locations |= overlapping_span.metadata
-        for geoname in candidate_geonames:
-            geoname.alternate_locations.remove(geoname)
-            geoname.overlapping_locations.remove(geoname)
+        candidates.index_overlaps()
+        candidate_geonames = candidates.rows
         logger.info('%s alternative locations found' % sum([
-            len(geoname.alternate_locations)
-            for geoname in candidate_geonames]))
+            candidates.count_alternates(idx)
+            for idx in range(len(candidates))]))
         logger.info('%s candidate locations prepared' %
                     len(candidate_geonames))
         return candidate_geonames
@@ -536,10 +787,15 @@ class GeonameAnnotator(Annotator):
         return [GeonameFeatures(geoname, spans_to_nes, span_to_tokens)
                 for geoname in geonames]
 
-    def add_contextual_features(self, candidate_geonames, features, base_classifier_predict, base_classifier_threshold):
+    def add_contextual_features(self, candidate_geonames, features, base_classifier_predict, base_classifier_threshold,
+                                recent_geonames=None):
         """
         Extend a list of features with values that are based on the geonames
         mentioned nearby.
+
+        The recent_geonames are resolved geonames mentioned before the text,
+        like in the previous window of a streamed document. The resolved
+        geonames most recently mentioned by the end of the text are returned.
         """
         scores = base_classifier_predict([list(f.values()) for f in features])
         for geoname, feature, score in zip(candidate_geonames, features, scores):
@@ -573,9 +829,17 @@ class GeonameAnnotator(Annotator):
         rf_start = 0
         # A ring buffer containing the recently mentioned resolved geoname
         # features.
+        BUFFER_SIZE = 10
         rf_buffer = []
+        if recent_geonames:
+            # The recently mentioned geonames are replaced with the matching
+            # candidates so mentions of the same location are not counted twice.
+            geonames_by_id = {
+                geoname.geonameid: geoname for geoname in candidate_geonames}
+            rf_buffer = [
+                geonames_by_id.get(geoname.geonameid, geoname)
+                for geoname in recent_geonames[-BUFFER_SIZE:]]
         rf_buffer_idx = 0
-        BUFFER_SIZE = 10
         # The number of characters to lookahead searching for nearby mentions.
         LOOKAHEAD_OFFSET = 50
         # Fill the buffer to capacity with initially mentioned resolved
@@ -606,6 +870,8 @@ class GeonameAnnotator(Annotator):
                 rfs_iter_end = True
         for feature in features:
             feature.set_contextual_features()
+        rf_buffer_idx %= BUFFER_SIZE
+        return rf_buffer[rf_buffer_idx:] + rf_buffer[:rf_buffer_idx]
 
     def annotate(self, doc, show_features_for_geonameids=None, split_compound_geonames=False):
         logger.info('geoannotator started')
@@ -615,10 +881,14 @@ class GeonameAnnotator(Annotator):
             doc.tiers['geonames'] = AnnoTier([])
             return doc
         logger.info('adding contextual features')
-        self.add_contextual_features(
+        context = doc.context
+        recent_geonames = self.add_contextual_features(
             candidate_geonames, features,
             self.geoname_classifier.predict_proba_base,
-            self.geoname_classifier.HIGH_CONFIDENCE_THRESHOLD)
+            self.geoname_classifier.HIGH_CONFIDENCE_THRESHOLD,
+            recent_geonames=context.get('recent_geonames') if context is not None else None)
+        if context is not None:
+            context['recent_geonames'] = recent_geonames
         scores = self.geoname_classifier.predict_proba_contextual([
             list(f.values()) for f in features])
         for geoname, score in zip(candidate_geonames, scores):
@@ -673,6 +943,7 @@ class GeonameAnnotator(Annotator):
                     setattr(geoname, attr, val)
                     prev_val = val
         logger.info('admin names added')
+        culled_geonames = resolve_geonames(culled_geonames)
         geospans = []
         for geoname in culled_geonames:
             for span in geoname.spans:
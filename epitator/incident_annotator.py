@@ -187,7 +187,7 @@ class IncidentAnnotator(Annotator):
             }))
         date_tier = AnnoTier(dates_out, presorted=True)
         phrase_spans = []
-        for sent_span, comma_group in sent_spans.group_spans_by_containing_span(doc.create_regex_tier(",")):
+        for sent_span, comma_group in sent_spans.group_regex_matches(","):
             phrase_spans += AnnoTier([sent_span]).subtract_overlaps(comma_group).spans
         phrase_spans = AnnoTier(phrase_spans)
         date_territories = get_territories(date_tier, sent_spans, phrase_spans)
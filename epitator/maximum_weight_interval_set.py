@@ -50,6 +50,13 @@ class Endpoint():
             return self.get_idx() < other.get_idx()
 
 
+# The order of endpoints at the same offset, matching Endpoint.__lt__.
+NON_ZERO_LENGTH_END_RANK = 0
+ZERO_LENGTH_START_RANK = 1
+NON_ZERO_LENGTH_START_RANK = 2
+ZERO_LENGTH_END_RANK = 3
+
+
 def find_maximum_weight_interval_set(intervals):
     """
     Takes a list of weighted intervals and returns a non-overlapping set of them
@@ -63,32 +70,61 @@ def find_maximum_weight_interval_set(intervals):
     the left endpoint of another interval without it being considered an overlap.
     Of course, if an endpoint is in the middle of another non-zero length
     interval, it is considered to be overlapping.
+
+    Endpoints are sorted by integer keys in the order Endpoint.__lt__
+    defines. The start and end of interval i are endpoints 2i and 2i + 1,
+    so endpoints with equal keys keep the order of their intervals.
+    Like the implementation this replaces, a zero length interval is
+    treated as if there were no preceding interval when it is the best set
+    so far, and the selected set ends at the last zero length interval in
+    its chain of predecessors.
+
+    >>> [interval.corresponding_object for interval in find_maximum_weight_interval_set([
+    ...     Interval(0, 3, 3, 'a'), Interval(2, 6, 4, 'b'), Interval(3, 5, 2, 'c')])]
+    ['a', 'c']
     """
-    endpoints = []
-    for interval in intervals:
-        endpoints.append(interval.start_endpoint())
-        endpoints.append(interval.end_endpoint())
-    sorted_endpoints = sorted(endpoints)
-    max_interval_sofar = None
-    for endpoint in sorted_endpoints:
-        if endpoint.is_start:
-            endpoint.interval.__value__ = endpoint.interval.weight
-            if max_interval_sofar:
-                if isinstance(max_interval_sofar.__value__, tuple):
-                    endpoint.interval.__value__ = tuple(map(sum, zip(max_interval_sofar.__value__,
-                                                                     endpoint.interval.__value__)))
+    interval_count = len(intervals)
+    starts = [interval.start for interval in intervals]
+    ends = [interval.end for interval in intervals]
+    weights = [interval.weight for interval in intervals]
+    keys = []
+    for start, end in zip(starts, ends):
+        if end - start == 0:
+            keys.append(start * 4 + ZERO_LENGTH_START_RANK)
+            keys.append(end * 4 + ZERO_LENGTH_END_RANK)
+        else:
+            keys.append(start * 4 + NON_ZERO_LENGTH_START_RANK)
+            keys.append(end * 4 + NON_ZERO_LENGTH_END_RANK)
+    # The combined weight of the MWIS ending with each interval and the
+    # index of the previous interval in it.
+    values = [None] * interval_count
+    previous = [-1] * interval_count
+    # The interval ending the MWIS so far, and whether it is a non-zero
+    # length interval.
+    best = -1
+    best_is_set = False
+    for endpoint in sorted(range(2 * interval_count), key=keys.__getitem__):
+        idx = endpoint >> 1
+        if endpoint & 1 == 0:
+            if best_is_set:
+                best_value = values[best]
+                if isinstance(best_value, tuple):
+                    values[idx] = tuple([
+                        best_item + item
+                        for best_item, item in zip(best_value, weights[idx])])
                 else:
-                    endpoint.interval.__value__ += max_interval_sofar.__value__
-                endpoint.interval.__previous__ = max_interval_sofar
-        else:  # endoint.is_end
-            if not max_interval_sofar:
-                max_interval_sofar = endpoint.interval
-            elif endpoint.interval.__value__ >= max_interval_sofar.__value__:
-                max_interval_sofar = endpoint.interval
+                    values[idx] = weights[idx] + best_value
+                previous[idx] = best
+            else:
+                values[idx] = weights[idx]
+        elif not best_is_set or values[idx] >= values[best]:
+            best = idx
+            best_is_set = ends[idx] - starts[idx] != 0
     mwis = []
-    while max_interval_sofar:
-        mwis.insert(0, max_interval_sofar)
-        max_interval_sofar = max_interval_sofar.__previous__
-    if len(intervals) >= 1:
+    while best >= 0 and ends[best] - starts[best] != 0:
+        mwis.append(intervals[best])
+        best = previous[best]
+    mwis.reverse()
+    if interval_count >= 1:
         assert len(mwis) >= 1
     return mwis
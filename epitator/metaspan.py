@@ -1,8 +1,19 @@
-from .annospan import AnnoSpan, SpanGroup
+from .annospan import AnnoSpan, SpanGroup, EMPTY_LIST
 from .utils import flatten, merge_dicts
 
+# Incremented whenever the metadata of a MetaSpan is replaced, so the
+# MetaGroups that stored merged metadata know to merge it again.
+_metadata_version = 0
+
+
+def _metadata_changed():
+    global _metadata_version
+    _metadata_version += 1
+
 
 class MetaSpan(AnnoSpan):
+    __slots__ = ["_metadata", "token"]
+
     def __init__(self, span=None, start=None, end=None, doc=None, metadata={}):
         if span is None:
             self.start = start
@@ -17,6 +28,7 @@ class MetaSpan(AnnoSpan):
             self.end = span.idx + len(span)
             self.token = span
             self.doc = doc
+        self.base_spans = EMPTY_LIST
         self.label = self.text
         self._metadata = span.metadata if isinstance(span, MetaSpan) else metadata
 
@@ -42,15 +54,18 @@ class MetaSpan(AnnoSpan):
     @metadata.setter
     def metadata(self, value):
         self._metadata = value
+        _metadata_changed()
 
     @metadata.deleter
     def metadata(self):
         del self._metadata
+        _metadata_changed()
 
     def update_metadata(self, metagen, *args, **kwargs):
         result = metagen.generate(self, *args, **kwargs)
         if isinstance(result, dict):
             self._metadata = merge_dicts([result, self._metadata], unique=True)
+            _metadata_changed()
         return self.metadata
 
     @property
@@ -60,7 +75,31 @@ class MetaSpan(AnnoSpan):
         return(tokens)
 
 
+# The attributes MetaGroups use to store their bounds and merged metadata.
+META_GROUP_CACHE_ATTRIBUTES = ('_bounds', '_merged_metadata')
+
+
 class MetaGroup(MetaSpan, SpanGroup):
+    """
+    A group of MetaSpans. The bounds and the metadata merged from the base
+    spans are stored when they are first accessed. The bounds are computed
+    again after spans are appended or shifted by AnnoDoc.edit, and the
+    merged metadata after the metadata of any MetaSpan is replaced or
+    updated. Like other SpanGroups, clear_cached_structure needs to be
+    called if the base spans are modified some other way.
+
+    MetaGroups still have a __dict__ since SpanGroup stores its structure
+    caches in it.
+
+    >>> from .annodoc import AnnoDoc
+    >>> doc = AnnoDoc('one two three')
+    >>> group = MetaGroup([AnnoSpan(4, 7, doc)])
+    >>> group.append(AnnoSpan(8, 13, doc))
+    >>> group.start, group.end
+    (4, 13)
+    """
+    __slots__ = ["_label"] + list(META_GROUP_CACHE_ATTRIBUTES)
+
     def __init__(self, base_spans, label=None):
         assert isinstance(base_spans, list)
         assert len(base_spans) > 0
@@ -68,6 +107,30 @@ class MetaGroup(MetaSpan, SpanGroup):
         self.doc = base_spans[0].doc
         self._label = label
         self._metadata = {}
+        self._bounds = None
+        self._merged_metadata = None
+
+    def __getstate__(self):
+        state = super(MetaGroup, self).__getstate__()
+        for slot in MetaSpan.__slots__ + ["_label"]:
+            try:
+                state[slot] = getattr(self, slot)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        for slot in MetaSpan.__slots__ + ["_label"]:
+            if slot in state:
+                setattr(self, slot, state.pop(slot))
+        super(MetaGroup, self).__setstate__(state)
+        self.clear_cached_structure()
+
+    def clear_cached_structure(self):
+        super(MetaGroup, self).clear_cached_structure()
+        self._bounds = None
+        self._merged_metadata = None
 
     def __repr__(self):
         return "MetaGroup(start={}, end={}, doc={}, metadata={})".format(self.start,
@@ -97,13 +160,21 @@ class MetaGroup(MetaSpan, SpanGroup):
 #             return span
 #         raise StopIteration
 
+    def _get_bounds(self):
+        bounds = self._bounds
+        if bounds is None:
+            bounds = self._bounds = (
+                min([s.start for s in self.base_spans]),
+                max([s.end for s in self.base_spans]))
+        return bounds
+
     @property
     def start(self):
-        return(min([s.start for s in self.base_spans]))
+        return self._get_bounds()[0]
 
     @property
     def end(self):
-        return(max([s.end for s in self.base_spans]))
+        return self._get_bounds()[1]
 
     @property
     def text(self):
@@ -117,15 +188,25 @@ class MetaGroup(MetaSpan, SpanGroup):
             return(self._label)
 
     @property
-    def metadata(self, **kwargs):
-        metadata_list = [self._metadata] + [s.metadata for s in self.iterate_base_spans()]
-        metadata = merge_dicts(metadata_list, unique=True, **kwargs)
-        return(metadata)
+    def metadata(self):
+        merged_metadata = self._merged_metadata
+        if merged_metadata is None or merged_metadata[0] != _metadata_version:
+            metadata_list = [self._metadata] + [s.metadata for s in self.iterate_base_spans()]
+            merged_metadata = self._merged_metadata = (
+                _metadata_version, merge_dicts(metadata_list, unique=True))
+        # A copy is returned so changes to it don't alter the stored metadata.
+        return dict(merged_metadata[1])
+
+    @metadata.setter
+    def metadata(self, value):
+        self._metadata = value
+        _metadata_changed()
 
     def update_group_metadata(self, metagen, *args, **kwargs):
         result = metagen.generate(self, *args, **kwargs)
         if isinstance(result, dict):
             self._metadata = merge_dicts([result, self._metadata], unique=True)
+            _metadata_changed()
         return self.metadata
 
     def update_base_span_metadata(self, metagen, *args, **kwargs):
@@ -152,3 +233,4 @@ class MetaGroup(MetaSpan, SpanGroup):
             self.base_spans.append(spans)
         elif isinstance(spans, list):
             self.base_spans.extend(spans)
+        self.clear_cached_structure()
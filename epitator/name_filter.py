@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# coding=utf8
+"""
+Filters for ruling out ngrams that cannot match a name in the database
+before it is queried.
+"""
+from __future__ import absolute_import
+from six.moves import range
+
+
+def first_word(text):
+    return text.split(' ', 1)[0]
+
+
+class BloomFilter(object):
+    """
+    A set of strings that may report strings that were not added as members,
+    but never reports that an added string is missing.
+
+    >>> bloom_filter = BloomFilter(100)
+    >>> bloom_filter.add('paris')
+    >>> 'paris' in bloom_filter
+    True
+    """
+    def __init__(self, capacity, bits_per_item=10, hash_count=6):
+        self.size = max(64, capacity * bits_per_item)
+        self.hash_count = hash_count
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        hash_1 = hash(value)
+        hash_2 = hash((value, 1)) | 1
+        size = self.size
+        return [(hash_1 + i * hash_2) % size for i in range(self.hash_count)]
+
+    def add(self, value):
+        bits = self.bits
+        for position in self._positions(value):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        bits = self.bits
+        for position in self._positions(value):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class FirstWordFilter(object):
+    """
+    A Bloom filter of the first words of the names in a database column.
+    Text can only be equal to one of the names if its first word is in the
+    filter, so ngrams whose text fails the check don't need to be looked up.
+    Words are split on spaces like first_word.
+
+    >>> import sqlite3
+    >>> connection = sqlite3.connect(':memory:')
+    >>> _ = connection.execute("CREATE TABLE names (name TEXT)")
+    >>> _ = connection.executemany("INSERT INTO names VALUES (?)",
+    ...                            [('new ' + str(i),) for i in range(100)])
+    >>> name_filter = FirstWordFilter(connection, 'names', 'name')
+    >>> name_filter.could_match('new york')
+    True
+    >>> name_filter.bloom_filter.size
+    64
+    """
+    def __init__(self, connection, table, column):
+        # The first words are extracted by SQLite so each distinct word is
+        # only passed to Python once. The filter is sized for the distinct
+        # words since many names share their first word.
+        words = [row[0] for row in connection.execute(
+            "SELECT DISTINCT substr({0}, 1, instr({0} || ' ', ' ') - 1) FROM {1}".format(
+                column, table))]
+        self.bloom_filter = BloomFilter(len(words))
+        for word in words:
+            self.bloom_filter.add(word)
+
+    def could_match(self, text):
+        return first_word(text) in self.bloom_filter
@@ -3,7 +3,68 @@
 from __future__ import absolute_import
 from .annotator import Annotator, AnnoTier, AnnoSpan
 from .token_annotator import TokenAnnotator
-from six.moves import range
+from six.moves import range, zip
+
+
+class NgramTier(AnnoTier):
+    """
+    A tier of the ngrams of a sequence of tokens. The ngram spans are only
+    created when the spans are accessed. Annotators that only need the
+    offsets and tokens of each ngram can iterate over them with ngrams().
+    """
+    def __init__(self, doc, token_spans, n_min=1, n_max=5):
+        self.doc = doc
+        self.token_spans = token_spans
+        self.n_min = n_min
+        self.n_max = n_max
+        self._spans = None
+
+    def ngrams(self):
+        """
+        Yield the start offset, end offset and list of tokens of each ngram
+        in the same order as the tier's spans.
+        """
+        token_spans = self.token_spans
+        token_count = len(token_spans)
+        for i in range(token_count):
+            start = token_spans[i].start
+            for n in range(self.n_min, min(self.n_max, token_count - i) + 1):
+                yield start, token_spans[i + n - 1].end, token_spans[i:i + n]
+
+    @property
+    def spans(self):
+        if self._spans is None:
+            doc = self.doc
+            self._spans = [
+                AnnoSpan(start, end, doc)
+                for start, end, tokens in self.ngrams()]
+        return self._spans
+
+    @spans.setter
+    def spans(self, spans):
+        self._spans = spans
+        self.token_spans = None
+
+    def __len__(self):
+        if self._spans is None:
+            token_count = len(self.token_spans)
+            return sum(
+                max(0, token_count - n + 1)
+                for n in range(self.n_min, self.n_max + 1))
+        return len(self._spans)
+
+    def group_spans_by_containing_span(self,
+                                       other_tier,
+                                       allow_partial_containment=False):
+        # The tokens contained by each ngram are the ones it was created from.
+        if self.token_spans is None or allow_partial_containment or not (
+                isinstance(other_tier, AnnoTier) and
+                other_tier.spans is self.token_spans):
+            return super(NgramTier, self).group_spans_by_containing_span(
+                other_tier, allow_partial_containment)
+        return (
+            (span, tokens)
+            for span, (start, end, tokens) in zip(self.spans, self.ngrams()))
 
 
 class NgramAnnotator(Annotator):
@@ -17,19 +78,7 @@ class NgramAnnotator(Annotator):
         if 'tokens' not in doc.tiers:
             doc.add_tiers(TokenAnnotator())
 
-        ngram_spans = []
-
-        token_spans = doc.tiers['tokens'].spans
-
-        for n in range(self.n_min, self.n_max + 1):
-            for i in range(len(token_spans)):
-                if i + n > len(token_spans):
-                    break
-                span = AnnoSpan(token_spans[i].start,
-                                token_spans[i + n - 1].end,
-                                doc)
-                ngram_spans.append(span)
-
-        doc.tiers['ngrams'] = AnnoTier(ngram_spans)
+        doc.tiers['ngrams'] = NgramTier(
+            doc, doc.tiers['tokens'].spans, self.n_min, self.n_max)
 
         return doc
@@ -4,7 +4,8 @@ and resolves them to uris."""
 from __future__ import absolute_import
 from .annotator import Annotator, AnnoSpan, AnnoTier
 from .annospan import SpanGroup
-from .ngram_annotator import NgramAnnotator
+from .ngram_annotator import NgramAnnotator, NgramTier
+from .name_filter import FirstWordFilter
 from .spacy_annotator import SpacyAnnotator
 from .get_database_connection import get_database_connection
 from collections import defaultdict
@@ -45,6 +46,8 @@ class ResolvedKeywordAnnotator(Annotator):
     def __init__(self):
         self.connection = get_database_connection()
         self.connection.row_factory = sqlite3.Row
+        # A filter of the first words of the synonyms
+        self.name_filter = FirstWordFilter(self.connection, 'synonyms', 'synonym')
 
     @property
     def synonyms(self):
@@ -57,22 +60,36 @@ class ResolvedKeywordAnnotator(Annotator):
         tokens = doc.require_tiers('spacy.tokens', via=SpacyAnnotator)
         ngrams = doc.require_tiers('ngrams', via=NgramAnnotator)
 
+        if isinstance(ngrams, NgramTier) and ngrams.token_spans is tokens.spans:
+            ngram_spans = ngrams.ngrams()
+        else:
+            ngram_spans = (
+                (span.start, span.end, span_tokens)
+                for span, span_tokens in ngrams.group_spans_by_containing_span(tokens))
+        # Ngrams are identified by their offsets. Spans are only created for
+        # the ones that resolve to a keyword. Texts that can't be equal to a
+        # synonym are left out.
+        could_match = self.name_filter.could_match
         span_text_to_spans = defaultdict(list)
-        for ngram_span, ngram_tokens in ngrams.group_spans_by_containing_span(tokens):
-            span_text = ngram_span.text
-            span_text_to_spans[span_text].append(ngram_span)
+        for start, end, ngram_tokens in ngram_spans:
+            ngram_offsets = (start, end)
+            span_text = doc.text[start:end]
+            if could_match(span_text):
+                span_text_to_spans[span_text].append(ngram_offsets)
             # Remove internal hyphens and slashes. Ones at the start and end
             # could be part of punctuation or formatting.
             normalized_text = re.sub(r"\b[\s\-\/]+\b", " ", span_text.lower()).strip()
             normalized_text = re.sub(r"['\"]", "", normalized_text)
-            if span_text != normalized_text:
-                span_text_to_spans[normalized_text].append(ngram_span)
+            if span_text != normalized_text and could_match(normalized_text):
+                span_text_to_spans[normalized_text].append(ngram_offsets)
             # Match pluralized keywords by lemmatizing the final token.
             lemmatized_text = ngram_tokens[-1].lemma_
             if not span_text.endswith(lemmatized_text):
                 if len(ngram_tokens) > 1:
                     lemmatized_text = SpanGroup(ngram_tokens[0:-1]).text + ' ' + lemmatized_text
-                span_text_to_spans[lemmatized_text.lower()].append(ngram_span)
+                lemmatized_text = lemmatized_text.lower()
+                if could_match(lemmatized_text):
+                    span_text_to_spans[lemmatized_text].append(ngram_offsets)
 
         ngrams = list(set(span_text_to_spans.keys()))
         cursor = self.connection.cursor()
@@ -94,8 +111,8 @@ class ResolvedKeywordAnnotator(Annotator):
                         match_weight = 1
                     else:
                         match_weight = 0
-                    for span in span_text_to_spans[ngram]:
-                        spans_to_resolved_keywords[span].append(
+                    for offsets in span_text_to_spans[ngram]:
+                        spans_to_resolved_keywords[offsets].append(
                             dict(result,
                                  weight=result['weight'] + match_weight))
                         entity_ids.add(result['entity_id'])
@@ -112,7 +129,7 @@ class ResolvedKeywordAnnotator(Annotator):
         for result in results:
             ids_to_entities[result['id']] = {k: result[k] for k in result.keys()}
         spans = []
-        for span, resolved_keywords in spans_to_resolved_keywords.items():
+        for (start, end), resolved_keywords in spans_to_resolved_keywords.items():
             sorted_resolved_keywords = sorted(resolved_keywords,
                                               key=lambda k: -k['weight'])
             resolutions = []
@@ -125,6 +142,6 @@ class ResolvedKeywordAnnotator(Annotator):
                             'entity': ids_to_entities[keyword['entity_id']],
                             'weight': keyword['weight']}
                 resolutions.append(res_dict)
-            spans.append(ResolvedKeywordSpan(span, resolutions))
+            spans.append(ResolvedKeywordSpan(AnnoSpan(start, end, doc), resolutions))
         tier = AnnoTier(spans).optimal_span_set()
         return {'resolved_keywords': tier}
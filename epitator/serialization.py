@@ -0,0 +1,732 @@
+#!/usr/bin/env python
+# coding=utf8
+"""
+A compact binary format for annotated documents.
+
+The spans in all of a document's tiers are stored in a node table with
+columns for their start and end offsets, labels, classes, metadata and base
+spans, and each tier is stored as an array of node indices. Labels, class
+names and the other strings in the document are stored once in an interned
+string table. Metadata and the other attributes of spans are stored with a
+tagged binary encoding where spans and objects are stored by reference, so
+objects shared by many spans, like the parents of geonames, are only stored
+once. The tiers the SpacyAnnotator creates are not stored, since the spaCy
+parse can't be, so they are created again when annotators require them.
+
+Files are memory mapped when they are loaded and the spans of a tier are only
+decoded when they are first accessed.
+
+Loading a document only creates instances of the span and metadata classes
+registered with register_class, which include the classes EpiTator's
+annotators store in tiers, and their attributes are set without running any
+other code. Datetimes and the builtin types used as defaultdict factories are
+stored natively. Values of any other type can only be written and read with
+allow_pickle=True, which stores them with pickle and lets a file import any
+class. Only load files with allow_pickle=True if they come from a trusted
+source, since unpickling untrusted data can execute arbitrary code.
+"""
+from __future__ import absolute_import
+import collections
+import datetime
+import importlib
+import json
+import mmap
+import pickle
+import sqlite3
+import struct
+import six
+from .annodoc import AnnoDoc, SPACY_TIER_NAMES
+from .annospan import AnnoSpan, EMPTY_LIST
+from .annotier import AnnoTier
+
+MAGIC = b'EPITATOR'
+VERSION = 2
+# Version 1 files can be read since version 2 only added value types.
+READABLE_VERSIONS = (1, 2)
+
+INT = struct.Struct('<i')
+LONG = struct.Struct('<q')
+DOUBLE = struct.Struct('<d')
+HEADER = struct.Struct('<8sii')
+
+# Flags indicating which of the span attributes stored in the node table
+# columns are set on a span.
+START = 1
+END = 2
+LABEL = 4
+METADATA = 8
+BASE_SPANS = 16
+DOC = 32
+# The span's remaining state is restored with its __setstate__ method.
+CUSTOM_STATE = 64
+
+NODE_COLUMNS = [
+    'start', 'end', 'label', 'class', 'flags', 'metadata', 'state',
+    'base_start', 'base_count']
+
+_slot_descriptor_cache = {}
+
+# The paths of the classes that can be written and loaded without
+# allow_pickle.
+_registered_class_paths = set([
+    'epitator.annospan:AnnoSpan',
+    'epitator.annospan:SpanGroup',
+    'epitator.metaspan:MetaSpan',
+    'epitator.metaspan:MetaGroup',
+    'epitator.spacy_annotator:TokenSpan',
+    'epitator.spacy_annotator:SentSpan',
+    'epitator.spacy_annotator:StoredToken',
+    'epitator.spacy_annotator:StoredSpan',
+    'epitator.count_annotator:CountSpan',
+    'epitator.date_annotator:DateSpan',
+    'epitator.resolved_keyword_annotator:ResolvedKeywordSpan',
+    'epitator.geoname_annotator:GeoSpan',
+    'epitator.geoname_annotator:ResolvedGeoname',
+])
+
+# The builtin types that can be stored as the default factories of
+# defaultdicts.
+BUILTIN_TYPES = {
+    cls.__name__: cls
+    for cls in [list, dict, set, frozenset, tuple, int, float, bool]}
+
+
+class _FixedOffset(datetime.tzinfo):
+    """
+    The time zone of a loaded datetime. Only the UTC offset of the time zone
+    of a datetime is stored.
+    """
+    def __init__(self, seconds):
+        self.offset = datetime.timedelta(seconds=seconds)
+
+    def utcoffset(self, dt):
+        return self.offset
+
+    def dst(self, dt):
+        return datetime.timedelta(0)
+
+    def tzname(self, dt):
+        return None
+
+    def __getinitargs__(self):
+        return (int(self.offset.total_seconds()),)
+
+
+def register_class(cls):
+    """
+    Allow instances of the class to be written and loaded. Their attributes
+    are stored and set directly when they are loaded, or with __getstate__
+    and __setstate__ if the class defines them.
+    """
+    _registered_class_paths.add(_class_path(cls))
+    return cls
+
+
+def _slot_descriptors(cls):
+    """
+    Return a dict mapping the names of the slots of the class and its bases
+    to their descriptors. The descriptors are used so slots can be read and
+    written even when a subclass shadows them with a property.
+    """
+    descriptors = _slot_descriptor_cache.get(cls)
+    if descriptors is None:
+        descriptors = {}
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get('__slots__', ())
+            if isinstance(slots, six.string_types):
+                slots = [slots]
+            for name in slots:
+                if name not in ('__dict__', '__weakref__'):
+                    descriptors[name] = klass.__dict__[name]
+        _slot_descriptor_cache[cls] = descriptors
+    return descriptors
+
+
+def _has_custom_state(cls):
+    getstate = getattr(cls, '__getstate__', None)
+    return getstate is not None and getstate is not getattr(object, '__getstate__', None)
+
+
+def _get_state(obj):
+    if _has_custom_state(type(obj)):
+        return dict(obj.__getstate__())
+    state = {}
+    for name, descriptor in _slot_descriptors(type(obj)).items():
+        try:
+            state[name] = descriptor.__get__(obj, type(obj))
+        except AttributeError:
+            pass
+    state.update(getattr(obj, '__dict__', {}))
+    return state
+
+
+def _set_state(obj, state, custom):
+    if custom:
+        obj.__setstate__(state)
+        return
+    descriptors = _slot_descriptors(type(obj))
+    for name, value in state.items():
+        if name in descriptors:
+            descriptors[name].__set__(obj, value)
+        else:
+            obj.__dict__[name] = value
+
+
+def _is_plain_object(value):
+    """
+    Return true if the value is an instance of a python class that can be
+    recreated from its attributes.
+    """
+    cls = type(value)
+    if cls.__module__ in ('builtins', '__builtin__') or isinstance(value, type):
+        return False
+    return (
+        (hasattr(value, '__dict__') or _slot_descriptors(cls)) and
+        cls.__reduce_ex__ is object.__reduce_ex__ and
+        cls.__reduce__ is object.__reduce__)
+
+
+def _class_path(cls):
+    return cls.__module__ + ':' + getattr(cls, '__qualname__', cls.__name__)
+
+
+def _import_class(path, allow_pickle=False):
+    if not allow_pickle and path not in _registered_class_paths:
+        raise ValueError(
+            "Loading instances of " + path + " is not allowed. "
+            "Register the class with register_class or load trusted files "
+            "with allow_pickle=True.")
+    module_name, qualname = path.split(':')
+    value = importlib.import_module(module_name)
+    for name in qualname.split('.'):
+        value = getattr(value, name)
+    return value
+
+
+class _Writer(object):
+    def __init__(self, doc, allow_pickle=False):
+        self.doc = doc
+        self.allow_pickle = allow_pickle
+        self.strings = []
+        self.string_ids = {}
+        self.values = bytearray()
+        # Spans and objects are kept in these lists so their ids are not
+        # reused while the document is being encoded.
+        self.nodes = []
+        self.node_ids = {}
+        self.objects = []
+        self.object_ids = {}
+        self.columns = {name: [] for name in NODE_COLUMNS}
+        self.base_ids = []
+        self.object_classes = []
+        self.object_states = []
+        self.class_ids = {}
+
+    def string_id(self, string):
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def class_id(self, cls):
+        class_id = self.class_ids.get(cls)
+        if class_id is None:
+            path = _class_path(cls)
+            if not self.allow_pickle and path not in _registered_class_paths:
+                raise TypeError(
+                    "Instances of " + path + " can't be written. "
+                    "Register the class with register_class or use allow_pickle=True.")
+            class_id = self.class_ids[cls] = self.string_id(six.text_type(path))
+        return class_id
+
+    def node_id(self, span):
+        node_id = self.node_ids.get(id(span))
+        if node_id is None:
+            node_id = self.node_ids[id(span)] = len(self.nodes)
+            self.nodes.append(span)
+        return node_id
+
+    def object_id(self, obj):
+        object_id = self.object_ids.get(id(obj))
+        if object_id is None:
+            object_id = self.object_ids[id(obj)] = len(self.objects)
+            self.objects.append(obj)
+        return object_id
+
+    def encode_value(self, value):
+        """
+        Append the encoded value to the value buffer and return its offset.
+        """
+        offset = len(self.values)
+        self.encode(value)
+        return offset
+
+    def encode(self, value):
+        out = self.values
+        if value is None:
+            out += b'N'
+        elif value is True:
+            out += b'T'
+        elif value is False:
+            out += b'F'
+        elif isinstance(value, six.integer_types) and -2 ** 63 <= value < 2 ** 63:
+            out += b'i'
+            out += LONG.pack(value)
+        elif isinstance(value, float):
+            out += b'd'
+            out += DOUBLE.pack(value)
+        elif isinstance(value, six.text_type):
+            out += b's'
+            out += INT.pack(self.string_id(value))
+        elif isinstance(value, six.binary_type):
+            # Native strings are bytes on Python 2, so labels and metadata
+            # keys given as literals are stored this way there.
+            out += b'b'
+            out += INT.pack(len(value))
+            out += value
+        elif isinstance(value, AnnoSpan):
+            out += b'a'
+            out += INT.pack(self.node_id(value))
+        elif value is self.doc:
+            out += b'D'
+        elif isinstance(value, datetime.datetime):
+            utcoffset = value.utcoffset()
+            out += b't'
+            self.encode((
+                value.year, value.month, value.day, value.hour, value.minute,
+                value.second, value.microsecond,
+                None if utcoffset is None else int(utcoffset.total_seconds())))
+        elif isinstance(value, datetime.date):
+            out += b'e'
+            self.encode((value.year, value.month, value.day))
+        elif isinstance(value, datetime.timedelta):
+            out += b'w'
+            self.encode((value.days, value.seconds, value.microseconds))
+        elif isinstance(value, type) and BUILTIN_TYPES.get(value.__name__) is value:
+            out += b'c'
+            out += INT.pack(self.string_id(six.text_type(value.__name__)))
+        elif type(value) in (list, tuple, set, frozenset):
+            out += {list: b'l', tuple: b'u', set: b'S', frozenset: b'z'}[type(value)]
+            out += INT.pack(len(value))
+            for item in value:
+                self.encode(item)
+        elif type(value) is dict or isinstance(value, sqlite3.Row):
+            if isinstance(value, sqlite3.Row):
+                value = dict(zip(value.keys(), value))
+            out += b'm'
+            self.encode_items(value)
+        elif type(value) is collections.defaultdict:
+            out += b'y'
+            self.encode(value.default_factory)
+            self.encode_items(value)
+        elif _is_plain_object(value) and (
+                self.allow_pickle or _class_path(type(value)) in _registered_class_paths):
+            out += b'o'
+            out += INT.pack(self.object_id(value))
+        elif not self.allow_pickle:
+            raise TypeError(
+                "Values of type " + _class_path(type(value)) + " can't be written. "
+                "Register the class with register_class or use allow_pickle=True.")
+        else:
+            data = pickle.dumps(value, 2)
+            out += b'p'
+            out += INT.pack(len(data))
+            out += data
+
+    def encode_items(self, value):
+        self.values += INT.pack(len(value))
+        for key, item in value.items():
+            self.encode(key)
+            self.encode(item)
+
+    def encode_node(self, span):
+        columns = self.columns
+        cls = type(span)
+        state = _get_state(span)
+        flags = CUSTOM_STATE if _has_custom_state(cls) else 0
+        start = state.get('start')
+        end = state.get('end')
+        if isinstance(start, six.integer_types) and isinstance(end, six.integer_types):
+            flags |= START | END
+            del state['start'], state['end']
+        else:
+            start = end = 0
+        label = -1
+        if 'label' in state and (
+                state['label'] is None or isinstance(state['label'], six.text_type)):
+            flags |= LABEL
+            if state['label'] is not None:
+                label = self.string_id(state['label'])
+            del state['label']
+        metadata = -1
+        if 'metadata' in state:
+            flags |= METADATA
+            metadata = self.encode_value(state.pop('metadata'))
+        base_start = len(self.base_ids)
+        base_count = 0
+        base_spans = state.get('base_spans')
+        if isinstance(base_spans, list) and all(
+                isinstance(base_span, AnnoSpan) for base_span in base_spans):
+            flags |= BASE_SPANS
+            base_count = len(base_spans)
+            self.base_ids.extend(
+                self.node_id(base_span) for base_span in base_spans)
+            del state['base_spans']
+        if state.get('doc') is self.doc:
+            flags |= DOC
+            del state['doc']
+        columns['start'].append(start)
+        columns['end'].append(end)
+        columns['label'].append(label)
+        columns['class'].append(self.class_id(cls))
+        columns['flags'].append(flags)
+        columns['metadata'].append(metadata)
+        columns['state'].append(self.encode_value(state) if state or flags & CUSTOM_STATE else -1)
+        columns['base_start'].append(base_start)
+        columns['base_count'].append(base_count)
+
+    def encode_object(self, obj):
+        cls = type(obj)
+        self.object_classes.append(self.class_id(cls))
+        state = _get_state(obj)
+        self.object_states.append(self.encode_value(state))
+
+    def encode_pending(self):
+        """
+        Encode the nodes and objects that have been referenced but not
+        encoded yet.
+        """
+        while len(self.columns['start']) < len(self.nodes) or len(self.object_states) < len(self.objects):
+            while len(self.columns['start']) < len(self.nodes):
+                self.encode_node(self.nodes[len(self.columns['start'])])
+            while len(self.object_states) < len(self.objects):
+                self.encode_object(self.objects[len(self.object_states)])
+
+
+def _int_array(values):
+    return struct.pack('<%di' % len(values), *values)
+
+
+def _encode_document(doc, tier_names=None, allow_pickle=False):
+    """
+    Return a list of the byte strings that make up the serialized document.
+    """
+    writer = _Writer(doc, allow_pickle)
+    tier_ids = {}
+    tier_node_ids = []
+    tier_indices = {}
+    for name, tier in sorted(doc.tiers.items()):
+        if tier_names is not None and name not in tier_names:
+            continue
+        if name in SPACY_TIER_NAMES:
+            continue
+        tier_index = tier_ids.get(id(tier))
+        if tier_index is None:
+            tier_index = tier_ids[id(tier)] = len(tier_node_ids)
+            tier_node_ids.append([writer.node_id(span) for span in tier.spans])
+        tier_indices[name] = tier_index
+    date_offset = writer.encode_value(doc.date)
+    writer.encode_pending()
+    sections = []
+    data_length = [0]
+
+    def add_section(data):
+        offset = data_length[0]
+        sections.append(data)
+        data_length[0] += len(data)
+        return offset
+
+    text_data = doc.text.encode('utf8')
+    string_data = [string.encode('utf8') for string in writer.strings]
+    string_offsets = [0]
+    for data in string_data:
+        string_offsets.append(string_offsets[-1] + len(data))
+    header = {
+        'text': [add_section(text_data), len(text_data)],
+        'date': date_offset,
+        'strings': {
+            'count': len(string_data),
+            'offsets': add_section(_int_array(string_offsets)),
+            'data': add_section(b''.join(string_data)),
+        },
+        'nodes': {
+            'count': len(writer.nodes),
+            'columns': {
+                name: add_section(_int_array(values))
+                for name, values in writer.columns.items()},
+            'base_ids': add_section(_int_array(writer.base_ids)),
+        },
+        'objects': {
+            'count': len(writer.objects),
+            'classes': add_section(_int_array(writer.object_classes)),
+            'states': add_section(_int_array(writer.object_states)),
+        },
+        'values': add_section(bytes(writer.values)),
+        'tiers': tier_indices,
+        'tier_nodes': [
+            [add_section(_int_array(node_ids)), len(node_ids)]
+            for node_ids in tier_node_ids],
+    }
+    header_data = json.dumps(header, sort_keys=True).encode('utf8')
+    return [HEADER.pack(MAGIC, VERSION, len(header_data)), header_data] + sections
+
+
+def dump(doc, path, tier_names=None, allow_pickle=False):
+    """
+    Write the document and its tiers to the file at the given path.
+    If tier names are given only those tiers are written. The document's
+    annotation history and context and the spaCy tiers are not stored.
+    A TypeError is raised if the tiers contain values that can't be stored
+    without pickle, unless allow_pickle is true.
+    """
+    with open(path, 'wb') as f:
+        for data in _encode_document(doc, tier_names, allow_pickle):
+            f.write(data)
+
+
+def dumps(doc, tier_names=None, allow_pickle=False):
+    """
+    Return the serialized document as a byte string.
+    """
+    return b''.join(_encode_document(doc, tier_names, allow_pickle))
+
+
+class _Reader(object):
+    def __init__(self, buffer, data_offset, header, doc, allow_pickle=False):
+        self.buffer = buffer
+        self.allow_pickle = allow_pickle
+        self.data_offset = data_offset
+        self.header = header
+        self.doc = doc
+        self.strings = {}
+        self.classes = {}
+        self.nodes = {}
+        self.objects = {}
+        self.columns = {
+            name: data_offset + offset
+            for name, offset in header['nodes']['columns'].items()}
+        self.values_offset = data_offset + header['values']
+
+    def int_at(self, offset, idx):
+        return INT.unpack_from(self.buffer, offset + 4 * idx)[0]
+
+    def column(self, name, idx):
+        return INT.unpack_from(self.buffer, self.columns[name] + 4 * idx)[0]
+
+    def string(self, idx):
+        string = self.strings.get(idx)
+        if string is None:
+            strings = self.header['strings']
+            offsets = self.data_offset + strings['offsets']
+            data = self.data_offset + strings['data']
+            start = data + self.int_at(offsets, idx)
+            end = data + self.int_at(offsets, idx + 1)
+            string = self.strings[idx] = self.buffer[start:end].decode('utf8')
+        return string
+
+    def cls(self, idx):
+        cls = self.classes.get(idx)
+        if cls is None:
+            cls = self.classes[idx] = _import_class(self.string(idx), self.allow_pickle)
+        return cls
+
+    def node(self, idx):
+        span = self.nodes.get(idx)
+        if span is not None:
+            return span
+        cls = self.cls(self.column('class', idx))
+        span = self.nodes[idx] = cls.__new__(cls)
+        descriptors = _slot_descriptors(cls)
+        flags = self.column('flags', idx)
+        if flags & START:
+            descriptors['start'].__set__(span, self.column('start', idx))
+            descriptors['end'].__set__(span, self.column('end', idx))
+        if flags & LABEL:
+            label = self.column('label', idx)
+            descriptors['label'].__set__(
+                span, None if label == -1 else self.string(label))
+        if flags & METADATA:
+            descriptors['metadata'].__set__(
+                span, self.value(self.column('metadata', idx)))
+        if flags & BASE_SPANS:
+            base_count = self.column('base_count', idx)
+            if base_count:
+                base_ids = self.data_offset + self.header['nodes']['base_ids']
+                base_start = self.column('base_start', idx)
+                descriptors['base_spans'].__set__(span, [
+                    self.node(self.int_at(base_ids, base_start + i))
+                    for i in range(base_count)])
+            else:
+                descriptors['base_spans'].__set__(span, EMPTY_LIST)
+        if flags & DOC:
+            descriptors['doc'].__set__(span, self.doc)
+        state_offset = self.column('state', idx)
+        if state_offset != -1:
+            _set_state(span, self.value(state_offset), flags & CUSTOM_STATE)
+        return span
+
+    def object(self, idx):
+        obj = self.objects.get(idx)
+        if obj is not None:
+            return obj
+        objects = self.header['objects']
+        cls = self.cls(self.int_at(self.data_offset + objects['classes'], idx))
+        obj = self.objects[idx] = cls.__new__(cls)
+        state = self.value(self.int_at(self.data_offset + objects['states'], idx))
+        _set_state(obj, state, _has_custom_state(cls))
+        return obj
+
+    def value(self, offset):
+        return self.decode(self.values_offset + offset)[0]
+
+    def decode(self, pos):
+        buffer = self.buffer
+        tag = buffer[pos:pos + 1]
+        pos += 1
+        if tag == b'N':
+            return None, pos
+        elif tag == b'T':
+            return True, pos
+        elif tag == b'F':
+            return False, pos
+        elif tag == b'i':
+            return LONG.unpack_from(buffer, pos)[0], pos + 8
+        elif tag == b'd':
+            return DOUBLE.unpack_from(buffer, pos)[0], pos + 8
+        elif tag == b'D':
+            return self.doc, pos
+        elif tag == b'y':
+            default_factory, pos = self.decode(pos)
+            result = collections.defaultdict(default_factory)
+            return self.decode_items(result, pos)
+        elif tag == b't':
+            fields, pos = self.decode(pos)
+            utcoffset = fields[7]
+            return datetime.datetime(*fields[:7], tzinfo=(
+                None if utcoffset is None else _FixedOffset(utcoffset))), pos
+        elif tag == b'e':
+            fields, pos = self.decode(pos)
+            return datetime.date(*fields), pos
+        elif tag == b'w':
+            fields, pos = self.decode(pos)
+            return datetime.timedelta(*fields), pos
+        value = INT.unpack_from(buffer, pos)[0]
+        pos += 4
+        if tag == b's':
+            return self.string(value), pos
+        elif tag == b'b':
+            return bytes(buffer[pos:pos + value]), pos + value
+        elif tag == b'a':
+            return self.node(value), pos
+        elif tag == b'o':
+            return self.object(value), pos
+        elif tag == b'c':
+            return BUILTIN_TYPES[self.string(value)], pos
+        elif tag == b'p':
+            if not self.allow_pickle:
+                raise ValueError(
+                    "The document contains pickled values. "
+                    "Load trusted files with allow_pickle=True to read them.")
+            return pickle.loads(buffer[pos:pos + value]), pos + value
+        elif tag in (b'l', b'u', b'S', b'z'):
+            items = []
+            for _ in range(value):
+                item, pos = self.decode(pos)
+                items.append(item)
+            return {b'l': list, b'u': tuple, b'S': set, b'z': frozenset}[tag](items), pos
+        elif tag == b'm':
+            return self.decode_items({}, pos - 4)
+        raise ValueError("Unknown value tag: " + repr(tag))
+
+    def decode_items(self, result, pos):
+        count = INT.unpack_from(self.buffer, pos)[0]
+        pos += 4
+        for _ in range(count):
+            key, pos = self.decode(pos)
+            item, pos = self.decode(pos)
+            result[key] = item
+        return result, pos
+
+
+class LazyAnnoTier(AnnoTier):
+    """
+    An AnnoTier loaded from a serialized document. Its spans are decoded
+    when they are first accessed.
+    """
+    def __init__(self, reader, node_ids_offset, count):
+        self._reader = reader
+        self._node_ids_offset = node_ids_offset
+        self._count = count
+        self._spans = None
+
+    @property
+    def spans(self):
+        if self._spans is None:
+            reader = self._reader
+            self._spans = [
+                reader.node(reader.int_at(self._node_ids_offset, i))
+                for i in range(self._count)]
+            self._reader = None
+        return self._spans
+
+    @spans.setter
+    def spans(self, spans):
+        self._spans = spans
+        self._reader = None
+
+    def __len__(self):
+        if self._spans is None:
+            return self._count
+        return len(self._spans)
+
+
+def _decode_document(buffer, doc=None, allow_pickle=False):
+    magic, version, header_length = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a serialized EpiTator document.")
+    if version not in READABLE_VERSIONS:
+        raise ValueError("Unsupported document format version: " + str(version))
+    header = json.loads(buffer[HEADER.size:HEADER.size + header_length].decode('utf8'))
+    data_offset = HEADER.size + header_length
+    text_offset, text_length = header['text']
+    text = buffer[
+        data_offset + text_offset:
+        data_offset + text_offset + text_length].decode('utf8')
+    if doc is None:
+        doc = AnnoDoc(text)
+        reader = _Reader(buffer, data_offset, header, doc, allow_pickle)
+        doc.date = reader.value(header['date'])
+        doc.tiers = {}
+    elif doc.text != text:
+        raise ValueError("The serialized document's text does not match.")
+    else:
+        reader = _Reader(buffer, data_offset, header, doc, allow_pickle)
+    tiers = [
+        LazyAnnoTier(reader, data_offset + offset, count)
+        for offset, count in header['tier_nodes']]
+    doc.tiers.update({
+        name: tiers[tier_index]
+        for name, tier_index in header['tiers'].items()})
+    return doc
+
+
+def load(path, allow_pickle=False):
+    """
+    Load a document written with dump. The file is memory mapped and each
+    tier's spans are decoded when they are first accessed.
+    Only use allow_pickle=True for files from a trusted source.
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return _decode_document(buffer, allow_pickle=allow_pickle)
+
+
+def loads(data, doc=None, allow_pickle=False):
+    """
+    Load a document serialized with dumps. If a document is given the
+    serialized tiers are added to it instead of a new document. Its text
+    must match the serialized text.
+    Only use allow_pickle=True for data from a trusted source.
+    """
+    return _decode_document(data, doc, allow_pickle)
@@ -2,10 +2,54 @@
 """Create annotation tiers using spacy"""
 from __future__ import absolute_import
 from .annotator import Annotator, AnnoSpan, AnnoTier
+from .annospan import SpanGroup
 import re
 from .spacy_nlp import spacy_nlp, custom_sentencizer
 
 
+class StoredToken(object):
+    """
+    The attributes of a spaCy token that are kept when a TokenSpan is
+    pickled or serialized. spaCy tokens can't be stored without their spaCy
+    document.
+    """
+    attributes = ['i', 'idx', 'text', 'lemma_', 'lower_', 'pos_', 'tag_',
+                  'dep_', 'ent_type_', 'ent_iob_', 'is_punct', 'like_num']
+
+    def __init__(self, token):
+        for attr in self.attributes:
+            setattr(self, attr, getattr(token, attr))
+
+    def __len__(self):
+        return len(self.text)
+
+
+class StoredSpan(object):
+    """
+    The attributes of a spaCy span that are kept when a SentSpan is pickled
+    or serialized.
+    """
+    attributes = ['start_char', 'end_char', 'text', 'label_']
+
+    def __init__(self, span):
+        for attr in self.attributes:
+            setattr(self, attr, getattr(span, attr))
+
+
+def _get_span_state(span, attr, stored_class):
+    state = {
+        slot: getattr(span, slot)
+        for slot in AnnoSpan.__slots__ if hasattr(span, slot)}
+    value = getattr(span, attr)
+    state[attr] = value if isinstance(value, stored_class) else stored_class(value)
+    return state
+
+
+def _set_span_state(span, state):
+    for key, value in state.items():
+        setattr(span, key, value)
+
+
 class TokenSpan(AnnoSpan):
     __slots__ = ['token']
 
@@ -40,6 +84,12 @@ class TokenSpan(AnnoSpan):
     def pos_(self):
         return self.token.pos_
 
+    def __getstate__(self):
+        return _get_span_state(self, 'token', StoredToken)
+
+    def __setstate__(self, state):
+        _set_span_state(self, state)
+
 
 class SentSpan(AnnoSpan):
     __slots__ = ['span']
@@ -55,6 +105,75 @@ class SentSpan(AnnoSpan):
     def offset(self):
         return self.start - self.span.start_char
 
+    def __getstate__(self):
+        return _get_span_state(self, 'span', StoredSpan)
+
+    def __setstate__(self, state):
+        _set_span_state(self, state)
+
+
+class TokenIndex(object):
+    """
+    An inverted index of a tier of TokenSpans. It maps the lemmas, lowercase
+    texts and parts of speech of the tokens to their sorted positions in the
+    tier.
+    """
+    def __init__(self, token_spans):
+        self.spans = token_spans
+        self.positions = {
+            'lemma': {},
+            'lower': {},
+            'pos': {},
+        }
+        lemma_positions = self.positions['lemma']
+        lower_positions = self.positions['lower']
+        pos_positions = self.positions['pos']
+        for position, span in enumerate(token_spans):
+            token = span.token
+            lemma_positions.setdefault(token.lemma_, []).append(position)
+            lower_positions.setdefault(token.lower_, []).append(position)
+            pos_positions.setdefault(token.pos_, []).append(position)
+
+    def spans_with(self, attribute, values):
+        """
+        Return a sorted list of the token spans with any of the given values
+        for the attribute.
+        """
+        value_positions = self.positions[attribute]
+        position_lists = [
+            value_positions[value] for value in set(values)
+            if value in value_positions]
+        if len(position_lists) == 1:
+            positions = position_lists[0]
+        else:
+            # Each token has one value for the attribute so the lists are
+            # disjoint.
+            positions = sorted(
+                position for positions in position_lists
+                for position in positions)
+        return [self.spans[position] for position in positions]
+
+    def search(self, attribute, values, label=None):
+        """
+        Create a tier of labeled span groups for the tokens with any of the
+        given values for the attribute, like AnnoTier.search_spans.
+        """
+        return AnnoTier([
+            SpanGroup([span], label)
+            for span in self.spans_with(attribute, values)], presorted=True)
+
+
+def get_token_index(tokens_tier):
+    """
+    Return the TokenIndex of a tier of TokenSpans. The SpacyAnnotator
+    creates the index with the tier. It is created again if the tier was
+    loaded or its spans have changed.
+    """
+    token_index = getattr(tokens_tier, 'token_index', None)
+    if token_index is None or token_index.spans is not tokens_tier.spans:
+        token_index = tokens_tier.token_index = TokenIndex(tokens_tier.spans)
+    return token_index
+
 
 class SpacyAnnotator(Annotator):
     def annotate(self, doc):
@@ -67,8 +186,10 @@ class SpacyAnnotator(Annotator):
         # entities. Each section is composed of N sentences. Sentence parsing
         # is not memory constrained.
         # https://github.com/explosion/spaCy/issues/1636
+        region_start, region_end = doc.region_bounds()
         sentences = AnnoTier([
-            SentSpan(sent, doc) for sent in custom_sentencizer(doc.text)])
+            SentSpan(sent, doc, offset=region_start)
+            for sent in custom_sentencizer(doc.text[region_start:region_end])])
         tiers['spacy.sentences'] = sentences
         group_size = 10
         for sent_group_idx in range(0, len(sentences), group_size):
@@ -119,5 +240,6 @@ class SpacyAnnotator(Annotator):
 
         tiers['spacy.noun_chunks'] = AnnoTier(noun_chunks, presorted=True)
         tiers['spacy.tokens'] = AnnoTier(token_spans, presorted=True)
+        tiers['spacy.tokens'].token_index = TokenIndex(token_spans)
         tiers['spacy.nes'] = AnnoTier(ne_spans, presorted=True)
         return tiers
@@ -59,19 +59,20 @@ class StructuredDataAnnotator(Annotator):
     """
 
     def annotate(self, doc):
-        doc_text_len = len(doc.text)
+        region_start, region_end = doc.region_bounds()
+        region_text = doc.text[region_start:region_end]
 
         def create_trimmed_annospan_for_doc(start, end, label=None, metadata=None):
             return AnnoSpan(
-                start,
-                min(doc_text_len, end),
+                region_start + start,
+                region_start + min(len(region_text), end),
                 doc,
                 label=label,
                 metadata=metadata).trimmed()
 
         spans = []
         value_spans = []
-        for token, start, end in table_parser.scanString(doc.text):
+        for token, start, end in table_parser.scanString(region_text):
             data = [[
                 create_trimmed_annospan_for_doc(value_start, value_end)
                 for ((value_start, value), (value_end, _)) in row] for row in token]
@@ -101,7 +102,7 @@ class StructuredDataAnnotator(Annotator):
                 "delimiter": next(k.split("delimiter:")[1] for k in token.keys() if k.startswith("delimiter:"))
             }))
             value_spans += new_value_spans
-        for token, start, end in key_value_list_parser.scanString(doc.text):
+        for token, start, end in key_value_list_parser.scanString(region_text):
             data = {
                 create_trimmed_annospan_for_doc(key_start, key_end): create_trimmed_annospan_for_doc(value_start, value_end)
                 for (((key_start, key), (key_end, _)), ((value_start, value), (value_end, _2))) in token
@@ -5,7 +5,7 @@ from .annospan import AnnoSpan, SpanGroup
 from .structured_data_annotator import StructuredDataAnnotator
 from .geoname_annotator import GeonameAnnotator
 from .resolved_keyword_annotator import ResolvedKeywordAnnotator
-from .spacy_annotator import SpacyAnnotator
+from .spacy_annotator import SpacyAnnotator, get_token_index
 from .date_annotator import DateAnnotator
 from .raw_number_annotator import RawNumberAnnotator
 from .utils import median
@@ -97,6 +97,9 @@ class StructuredIncidentAnnotator(Annotator):
                         k.doc,
                         metadata={'disease': resolution}))
                     break
+        incident_types = get_token_index(spacy_tokens).search(
+            'lower', ['case', 'cases', 'death', 'deaths'])
+        incident_statuses = spacy_tokens.search_spans(r'suspected|confirmed')
         entities_by_type = {
             'geoname': geonames,
             'date': dates,
@@ -107,8 +110,8 @@ class StructuredIncidentAnnotator(Annotator):
                 for span in numbers
                 if span.metadata['number'] == int(span.metadata['number'])
             ], presorted=True),
-            'incident_type': spacy_tokens.search_spans(r'(case|death)s?'),
-            'incident_status': spacy_tokens.search_spans(r'suspected|confirmed'),
+            'incident_type': incident_types,
+            'incident_status': incident_statuses,
         }
         tables = []
         possible_titles = doc.create_regex_tier("[^\n]+\n")\
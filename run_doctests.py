@@ -10,6 +10,16 @@ if __name__ == "__main__":
         doctest.testmod(epitator.annospan, raise_on_error=raise_on_error)
         import epitator.annodoc
         doctest.testmod(epitator.annodoc, raise_on_error=raise_on_error)
+        import epitator.annostream
+        doctest.testmod(epitator.annostream, raise_on_error=raise_on_error)
+        import epitator.maximum_weight_interval_set
+        doctest.testmod(epitator.maximum_weight_interval_set, raise_on_error=raise_on_error)
+        import epitator.columnar_tier
+        doctest.testmod(epitator.columnar_tier, raise_on_error=raise_on_error)
+        import epitator.name_filter
+        doctest.testmod(epitator.name_filter, raise_on_error=raise_on_error)
+        import epitator.metaspan
+        doctest.testmod(epitator.metaspan, raise_on_error=raise_on_error)
     except doctest.UnexpectedException as e:
         print("Failed example:")
         print(e.example.lineno, ":", e.example.source)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests that editing a document's text updates its tiers.
+"""
+from __future__ import absolute_import
+import unittest
+from epitator.annotator import AnnoDoc, AnnoTier, AnnoSpan
+from epitator.annospan import SpanGroup
+from epitator.count_annotator import CountAnnotator
+from epitator.metaspan import MetaGroup
+
+
+class TestAnnoDoc(unittest.TestCase):
+
+    def setUp(self):
+        self.annotator = CountAnnotator()
+
+    def test_edit(self):
+        doc = AnnoDoc("""
+As of 12 May 2017, 40 cases have been reported in the capital.
+Hospitals are treating 7 patients.
+The outbreak was first detected last month.""")
+        doc.add_tier(self.annotator)
+        start = doc.text.index('7 patients')
+        doc.edit(start, start + 1, '19')
+        expected = AnnoDoc(doc.text)
+        expected.add_tier(self.annotator)
+        self.assertEqual(
+            [(span.start, span.end, span.metadata['count'])
+             for span in doc.tiers['counts']],
+            [(span.start, span.end, span.metadata['count'])
+             for span in expected.tiers['counts']])
+        self.assertEqual(doc.tiers['counts'].spans[1].metadata['count'], 19)
+
+    def test_update_text(self):
+        doc = AnnoDoc("5 cases were reported. 3 people died.")
+        doc.add_tier(self.annotator)
+        doc.update_text("5 cases were reported. 30 people died.")
+        self.assertEqual(
+            [span.metadata['count'] for span in doc.tiers['counts']], [5, 30])
+        self.assertEqual(doc.tiers['counts'].spans[1].text, '30 people died')
+
+    def test_edit_span_groups(self):
+        doc = AnnoDoc('one two three four')
+        span_group = SpanGroup([AnnoSpan(8, 13, doc), AnnoSpan(14, 18, doc)])
+        # MetaGroups derive their bounds from their base spans, so only the
+        # base spans are shifted.
+        meta_group = MetaGroup([AnnoSpan(4, 7, doc), AnnoSpan(8, 13, doc)])
+        doc.tiers['groups'] = AnnoTier([span_group, meta_group])
+        doc.edit(0, 3, 'eleven')
+        self.assertEqual(
+            [(span.start, span.end, span.text) for span in doc.tiers['groups']],
+            [(7, 16, 'two three'), (11, 21, 'three four')])
+        self.assertEqual(
+            [(span.start, span.end) for span in span_group.base_spans],
+            [(11, 16), (17, 21)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import unittest
+import datetime
+from epitator.annotator import AnnoDoc, Annotator
+from epitator.annostream import annotate_stream
+from epitator.count_annotator import CountAnnotator
+from epitator.date_annotator import DateAnnotator
+
+
+class WordPairAnnotator(Annotator):
+    """
+    Annotates pairs of words starting from the start of the text, so windows
+    starting at different words pair them differently.
+    """
+    def annotate(self, doc):
+        return {'pairs': doc.create_regex_tier(r'\w+ \w+')}
+
+
+class TestAnnoStream(unittest.TestCase):
+
+    def setUp(self):
+        self.text = "\n".join([
+            "As of 12 May 2017, %d cases have been reported in the region. "
+            "Hospitals are treating %d patients and %d people have died." % (
+                10 + i, 20 + i, i + 1)
+            for i in range(20)])
+
+    def test_stream_matches_document(self):
+        doc = AnnoDoc(self.text)
+        doc.add_tiers(CountAnnotator())
+        spans = list(annotate_stream(
+            self.text.splitlines(True), [CountAnnotator()],
+            tier_names=['counts'], window_size=800, overlap=200))
+        self.assertEqual(
+            [(span.start, span.end, span.text, span.metadata['count'])
+             for tier_name, span in spans],
+            [(span.start, span.end, span.text, span.metadata['count'])
+             for span in doc.tiers['counts']])
+
+    def test_detected_date_carried_over(self):
+        text = "The report was published on 12 May 2017.\n" + (
+            "There is no date in this sentence.\n" * 20) + "Yesterday there were 5 cases."
+        spans = list(annotate_stream(
+            text, [DateAnnotator()], tier_names=['dates'],
+            window_size=200, overlap=50))
+        self.assertEqual(spans[-1][1].text, 'Yesterday')
+        self.assertEqual(
+            spans[-1][1].metadata['datetime_range'],
+            [datetime.datetime(2017, 5, 11), datetime.datetime(2017, 5, 12)])
+
+    def test_string_matches_chunks(self):
+        def stream(text):
+            return [
+                (tier_name, span.start, span.end, span.text)
+                for tier_name, span in annotate_stream(
+                    text, [CountAnnotator()], tier_names=['counts'],
+                    window_size=800, overlap=200)]
+        self.assertEqual(
+            stream(self.text), stream(self.text.splitlines(True)))
+        spans = list(annotate_stream(
+            self.text, [CountAnnotator()], window_size=800, overlap=200))
+        self.assertIsNone(spans[-1][1].doc.context)
+
+    def test_context_not_kept_on_document(self):
+        doc = AnnoDoc("The report was published on 12 May 2017.")
+        doc.add_tiers(DateAnnotator())
+        self.assertIsNone(doc.context)
+
+    def test_split_characters(self):
+        text = u"Fünf Fälle wurden gemeldet. " * 30
+        data = text.encode('utf8')
+        chunks = [data[idx:idx + 7] for idx in range(0, len(data), 7)]
+        spans = list(annotate_stream(
+            chunks, [WordPairAnnotator()], window_size=200, overlap=50))
+        self.assertEqual(
+            [span.text for tier_name, span in spans[:2]],
+            [u'Fünf Fälle', u'wurden gemeldet'])
+        self.assertEqual(len(spans), 60)
+        self.assertEqual(spans[-1][1].end, len(text) - 2)
+
+    def test_overlapping_spans_deduplicated(self):
+        text = " ".join("word%d" % i for i in range(200))
+        spans = list(annotate_stream(
+            text, [WordPairAnnotator()], window_size=300, overlap=100))
+        for (tier_name, span), (next_tier_name, next_span) in zip(spans, spans[1:]):
+            self.assertLessEqual(span.end, next_span.start)
+        self.assertEqual(spans[0][1].text, 'word0 word1')
+
+
+if __name__ == '__main__':
+    unittest.main()
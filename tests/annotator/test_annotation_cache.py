@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests that annotation results are loaded from the cache when the same
+document is annotated again.
+"""
+from __future__ import absolute_import
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from epitator.annotator import AnnoDoc, Annotator
+from epitator.count_annotator import CountAnnotator
+from epitator.annotation_cache import AnnotationCache
+
+
+class LazyAnnotator(Annotator):
+    """
+    An annotator with a database connection and state it creates the
+    first time it is used.
+    """
+    def __init__(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.count_annotator = CountAnnotator()
+        self._lookup = None
+
+    def annotate(self, doc):
+        if self._lookup is None:
+            self._lookup = set(['patients'])
+        return self.count_annotator.annotate(doc)
+
+
+class TestAnnotationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = AnnotationCache(os.path.join(self.directory, 'cache.sqlitedb'))
+
+    def tearDown(self):
+        self.cache.connection.close()
+        shutil.rmtree(self.directory)
+
+    def annotate(self, text):
+        doc = AnnoDoc(text)
+        self.cache.add_tiers(doc, CountAnnotator())
+        return doc
+
+    def test_hit(self):
+        text = 'Five patients died and 30 people were hospitalized.'
+        self.annotate(text)
+        doc = self.annotate(text)
+        self.assertEqual(
+            [span.metadata['count'] for span in doc.tiers['counts']], [5, 30])
+        self.assertIs(doc.tiers['counts'].spans[0].doc, doc)
+        self.assertNotIn('spacy.tokens', doc.tiers)
+        self.assertNotIn('spacy.nes', doc.tiers)
+        self.annotate('Five patients died.')
+        report = self.cache.report()
+        self.assertEqual(report['hits'], 1)
+        self.assertEqual(report['misses'], 2)
+        self.assertEqual(report['entries'], 2)
+
+    def test_eviction(self):
+        self.annotate('Five patients died.')
+        self.cache.max_size = self.cache.size()
+        self.annotate('Six patients died.')
+        self.assertEqual(self.cache.report()['entries'], 1)
+        self.annotate('Six patients died.')
+        self.assertEqual(self.cache.report()['hits'], 1)
+
+    def test_hit_after_lazy_initialization(self):
+        annotator = LazyAnnotator()
+        text = 'Five patients died.'
+        self.cache.add_tiers(AnnoDoc(text), annotator)
+        doc = self.cache.add_tiers(AnnoDoc(text), annotator)
+        self.assertEqual(self.cache.report()['hits'], 1)
+        self.assertEqual(
+            [span.metadata['count'] for span in doc.tiers['counts']], [5])
+        annotator.connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests that columnar tiers produce the same results as regular AnnoTiers.
+"""
+from __future__ import absolute_import
+import random
+import unittest
+from epitator.annotator import AnnoDoc, AnnoTier, AnnoSpan
+from epitator.columnar_tier import ColumnarAnnoTier
+
+
+def span_tuples(tier):
+    return [(span.start, span.end, span.label) for span in tier]
+
+
+def group_tuples(tier):
+    return [
+        tuple((span.start, span.end) for span in group.base_spans)
+        for group in tier]
+
+
+class TestColumnarTier(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = AnnoDoc('x' * 200)
+        rand = random.Random(5)
+        self.tiers = []
+        for i in range(2):
+            spans = []
+            for j in range(60):
+                start = rand.randint(0, 190)
+                spans.append(AnnoSpan(
+                    start, start + rand.randint(0, 10), self.doc,
+                    rand.choice([None, 'a', 'b'])))
+            self.tiers.append(AnnoTier(spans))
+
+    def test_spans(self):
+        tier = self.tiers[0]
+        columnar = ColumnarAnnoTier(
+            self.doc,
+            [span.start for span in tier],
+            [span.end for span in tier],
+            [span.label for span in tier])
+        self.assertEqual(span_tuples(columnar), span_tuples(tier))
+        self.assertEqual(len(columnar), len(tier))
+        self.assertIs(columnar[3], columnar.spans[3])
+        self.assertIs(ColumnarAnnoTier.from_tier(tier)[-1], tier.spans[-1])
+
+    def test_combinators(self):
+        tier_a, tier_b = self.tiers
+        columnar_a = ColumnarAnnoTier.from_tier(tier_a)
+        columnar_b = ColumnarAnnoTier.from_tier(tier_b)
+        for other, columnar_other in [(tier_b, columnar_b), (tier_b, tier_b)]:
+            for partial in [True, False]:
+                self.assertEqual([
+                    (span, group) for span, group in
+                    columnar_a.group_spans_by_containing_span(columnar_other, partial)
+                ], list(tier_a.group_spans_by_containing_span(other, partial)))
+            self.assertEqual(
+                span_tuples(columnar_a.without_overlaps(columnar_other)),
+                span_tuples(tier_a.without_overlaps(other)))
+            for allow_overlap in [True, False]:
+                self.assertEqual(
+                    group_tuples(columnar_a.with_following_spans_from(
+                        columnar_other, max_dist=5, allow_overlap=allow_overlap)),
+                    group_tuples(tier_a.with_following_spans_from(
+                        other, max_dist=5, allow_overlap=allow_overlap)))
+        self.assertEqual(
+            span_tuples(columnar_a.optimal_span_set()),
+            span_tuples(tier_a.optimal_span_set()))
+        self.assertEqual(
+            span_tuples(columnar_a.optimal_span_set(prefer='num_spans')),
+            span_tuples(tier_a.optimal_span_set(prefer='num_spans')))
+
+    def test_replaced_spans(self):
+        columnar = ColumnarAnnoTier(self.doc, [0, 5], [3, 9])
+        columnar.spans = [AnnoSpan(1, 2, self.doc)]
+        self.assertEqual(span_tuples(columnar), [(1, 2, None)])
+        self.assertEqual(
+            span_tuples(columnar.without_overlaps(AnnoTier())), [(1, 2, None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
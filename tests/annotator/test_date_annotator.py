@@ -3,7 +3,8 @@ from __future__ import absolute_import
 import unittest
 import datetime
 from epitator.annotator import AnnoDoc
-from epitator.date_annotator import DateAnnotator
+from epitator.date_annotator import DateAnnotator, parse_simple_date, period_datetime_range
+from dateparser.date import DateDataParser
 
 
 class DateAnnotatorTest(unittest.TestCase):
@@ -301,3 +302,34 @@ A 31-year-old man from east Delhi's Mandawali succumbed to malaria at Safdarjung
             [date.replace(tzinfo=None) for date in doc.tiers['dates'].spans[0].datetime_range],
             [datetime.datetime(2018, 9, 29, 13, 31),
              datetime.datetime(2018, 9, 30, 13, 31)])
+
+    def test_memoized_date_range(self):
+        text = 'The first case was reported on 12 March 2019.'
+        doc_date = datetime.datetime(2019, 4, 1)
+        doc = AnnoDoc(text, date=doc_date)
+        doc.add_tier(self.annotator)
+        doc.tiers['dates'].spans[0].datetime_range[1] = None
+        doc = AnnoDoc(text, date=doc_date)
+        doc.add_tier(self.annotator)
+        self.assertEqual(
+            doc.tiers['dates'].spans[0].datetime_range,
+            [datetime.datetime(2019, 3, 12),
+             datetime.datetime(2019, 3, 13)])
+
+    def test_simple_date_parsing(self):
+        parser = DateDataParser(['en'], settings={
+            'RELATIVE_BASE': datetime.datetime(2017, 5, 12),
+            'PREFER_DATES_FROM': 'past'})
+        for text in ['2019-03-12', '2019-3-5', '2019/03/12', '12/03/2019',
+                     '3/13/2019', '13/03/2019', '12-03-2019', '12.03.2019',
+                     '12 March 2019', '05 march 2019', '12 Mar 2019',
+                     '1 Sept 2019', 'March 2019', 'MAY 2019', 'Dec 1999',
+                     '2019', '1850', '0012']:
+            date_data = parser.get_date_data(text)
+            self.assertEqual(
+                parse_simple_date(text),
+                period_datetime_range(date_data['date_obj'], date_data['period']),
+                text)
+        for text in ['2019-13-01', '31 February 2019', '02/30/2019',
+                     '12 Foo 2019', 'next March', '0000', '12/3/19']:
+            self.assertIsNone(parse_simple_date(text), text)
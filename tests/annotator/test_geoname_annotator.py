@@ -5,7 +5,9 @@ the Geonames dataset."""
 from __future__ import absolute_import
 import unittest
 from epitator.annotator import AnnoDoc
-from epitator.geoname_annotator import GeonameAnnotator
+from epitator.annospan import AnnoSpan
+from epitator.geoname_annotator import (
+    GeonameAnnotator, GeonameCandidates, GEONAME_ATTRS, resolve_geonames)
 # import logging
 # from .test_utils import with_log_level
 import six
@@ -201,6 +203,16 @@ class GeonameAnnotatorTest(unittest.TestCase):
                     combined_span_found = True
         self.assertTrue(combined_span_found)
 
+    def test_candidate_relations(self):
+        doc = AnnoDoc("Springfield, Illinois and Springfield, Missouri")
+        candidates = self.annotator.get_candidate_geonames(doc)
+        for geoname in candidates:
+            self.assertTrue(geoname not in geoname.overlapping_locations)
+            self.assertTrue(geoname not in geoname.parents)
+            for alternate in geoname.alternate_locations:
+                self.assertTrue(geoname in alternate.alternate_locations)
+                self.assertTrue(alternate in geoname.overlapping_locations)
+
     def test_vietnamese(self):
         # Normally this should be spelled Cao Bằng, but I want to test
         # that the ascii version works.
@@ -249,6 +261,30 @@ Virginia on Friday.""")
         self.assertEqual(
             doc.tiers['geonames'].spans[0].geoname['geonameid'], '1153671')
 
+    def test_resolved_geonames(self):
+        doc = AnnoDoc("Reno, Nevada")
+        reno_span = AnnoSpan(0, 4, doc)
+        nevada_span = AnnoSpan(6, 12, doc)
+        rows = []
+        for geonameid, name in [('5511077', 'reno'), ('5509151', 'nevada')]:
+            row = {key: None for key in GEONAME_ATTRS}
+            row.update(geonameid=geonameid, name=name, lemmas_used=name)
+            rows.append(row)
+        candidates = GeonameCandidates(
+            rows, {'reno': [reno_span], 'nevada': [nevada_span]})
+        candidates.parent_ids[0] = (1,)
+        candidates.rows[0].admin1_name = 'Nevada'
+        reno, = resolve_geonames([candidates.rows[0]])
+        self.assertEqual(reno.name, 'reno')
+        self.assertEqual(reno.admin1_name, 'Nevada')
+        self.assertEqual(reno.spans, (reno_span,))
+        self.assertIn(reno_span, reno.original_spans)
+        nevada, = reno.parents
+        self.assertEqual(nevada.name, 'nevada')
+        self.assertFalse(hasattr(nevada, 'admin1_name'))
+        self.assertFalse(hasattr(reno, 'candidates'))
+        self.assertEqual(reno.to_dict()['parents'][0]['geonameid'], '5509151')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests that the bounds and metadata MetaGroups store reflect changes made to
+their base spans.
+"""
+from __future__ import absolute_import
+import unittest
+from epitator.annotator import AnnoDoc, AnnoTier, AnnoSpan
+from epitator.metaspan import MetaGroup
+
+
+class TextLength(object):
+    def generate(self, span):
+        return {'length': len(span.text)}
+
+
+class TestMetaSpan(unittest.TestCase):
+
+    def test_edit(self):
+        doc = AnnoDoc('one two three')
+        group = MetaGroup([AnnoSpan(8, 13, doc)])
+        doc.tiers['groups'] = AnnoTier([group])
+        self.assertEqual((group.start, group.end), (8, 13))
+        doc.edit(0, 3, 'eleven')
+        self.assertEqual(group.base_spans[0].start, 11)
+        self.assertEqual((group.start, group.end), (11, 16))
+        self.assertEqual(group.text, 'three')
+
+    def test_base_span_metadata_update(self):
+        doc = AnnoDoc('one two three')
+        group = MetaGroup([AnnoSpan(0, 3, doc), AnnoSpan(4, 7, doc)])
+        self.assertEqual(group.metadata, {})
+        group.base_spans[0].update_metadata(TextLength())
+        self.assertEqual(group.metadata, {'length': 3})
+        for span in group:
+            span.metadata = {'label': span.text}
+        self.assertEqual(sorted(group.metadata['label']), ['one', 'two'])
+        group.metadata['label'] = 'changed'
+        self.assertEqual(sorted(group.metadata['label']), ['one', 'two'])
+
+
+if __name__ == '__main__':
+    unittest.main()
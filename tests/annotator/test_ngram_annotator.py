@@ -2,7 +2,7 @@
 """Tests for the NgramAnnotator"""
 from __future__ import absolute_import
 import unittest
-from epitator.annotator import AnnoDoc
+from epitator.annotator import AnnoDoc, AnnoTier
 from epitator.ngram_annotator import NgramAnnotator
 
 
@@ -50,6 +50,21 @@ class NgramAnnotatorTest(unittest.TestCase):
         self.assertEqual(next(span_iter).text, 'tacos.')
         self.assertEqual(next(span_iter).text, '.')
 
+    def test_ngram_view(self):
+        doc = AnnoDoc("Bears eat tacos.")
+        doc.add_tier(self.annotator)
+        ngrams = doc.tiers['ngrams']
+
+        self.assertEqual(len(ngrams), 10)
+        self.assertEqual(
+            [(start, end) for start, end, tokens in ngrams.ngrams()],
+            [(span.start, span.end) for span in ngrams.spans])
+        groups = list(ngrams.group_spans_by_containing_span(doc.tiers['tokens']))
+        self.assertEqual(
+            [(span, [token.text for token in tokens]) for span, tokens in groups],
+            [(span, [token.text for token in tokens]) for span, tokens in
+             AnnoTier(ngrams.spans).group_spans_by_containing_span(doc.tiers['tokens'])])
+
 
 if __name__ == '__main__':
     unittest.main()
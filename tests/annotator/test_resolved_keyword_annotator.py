@@ -32,6 +32,11 @@ class ResolvedKeywordAnnotatorTest(unittest.TestCase):
             self.assertEqual([span.start, span.end],
                              expected_span['textOffsets'])
 
+    def test_name_filter(self):
+        name_filter = self.annotator.name_filter
+        for row in self.annotator.synonyms:
+            self.assertTrue(name_filter.could_match(row['synonym']))
+
     def test_capitalization_variations(self):
         doc = AnnoDoc("Mumps is mumps")
         doc.add_tier(self.annotator)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests that annotated documents can be written and loaded with the binary
+serialization format.
+"""
+from __future__ import absolute_import
+import collections
+import datetime
+import decimal
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from epitator.annotator import AnnoDoc, AnnoSpan
+from epitator.annotier import AnnoTier
+from epitator.count_annotator import CountAnnotator
+from epitator.spacy_annotator import SpacyAnnotator
+from epitator import serialization
+
+
+class UnregisteredSpan(AnnoSpan):
+    pass
+
+
+class TestSerialization(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'doc.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        doc = AnnoDoc('Five patients died and 30 people were hospitalized.',
+                      date=datetime.datetime(2017, 5, 12))
+        doc.add_tiers(CountAnnotator())
+        serialization.dump(doc, self.path)
+        loaded = serialization.load(self.path)
+        self.assertEqual(loaded.text, doc.text)
+        self.assertEqual(loaded.date, doc.date)
+        self.assertEqual(
+            sorted(loaded.tiers.keys()),
+            sorted(name for name in doc.tiers.keys() if not name.startswith('spacy.')))
+        for name, tier in loaded.tiers.items():
+            self.assertEqual(
+                [(span.start, span.end, span.label) for span in doc.tiers[name]],
+                [(span.start, span.end, span.label) for span in tier])
+        counts = loaded.tiers['counts'].spans
+        self.assertEqual([span.metadata['count'] for span in counts], [5, 30])
+        self.assertEqual(counts[0].metadata['attributes'],
+                         doc.tiers['counts'].spans[0].metadata['attributes'])
+        self.assertIs(counts[0].doc, loaded)
+
+    def test_pickle(self):
+        doc = AnnoDoc('Five patients died.')
+        doc.add_tiers(CountAnnotator())
+        unpickled = pickle.loads(pickle.dumps(doc))
+        self.assertNotIn('spacy.tokens', unpickled.tiers)
+        self.assertEqual(
+            [span.metadata['count'] for span in unpickled.tiers['counts']], [5])
+
+    def test_annotate_loaded(self):
+        doc = AnnoDoc('Five patients died.')
+        doc.add_tiers(CountAnnotator())
+        for loaded in [serialization.loads(serialization.dumps(doc)),
+                       pickle.loads(pickle.dumps(doc))]:
+            # The spaCy tiers are parsed again instead of being restored
+            # from snapshots that lack the parse tree.
+            tokens = loaded.require_tiers('spacy.tokens', via=SpacyAnnotator)
+            token = tokens.spans[1].token
+            self.assertEqual(token.text, 'patients')
+            self.assertTrue(hasattr(token, 'ancestors'))
+            self.assertTrue(hasattr(token, 'prob'))
+            self.assertIn('spacy.nes', loaded.tiers)
+
+    def test_native_strings(self):
+        doc = AnnoDoc('one two')
+        span = AnnoSpan(0, 3, doc, str('word'), {str('key'): str('value')})
+        doc.tiers['words'] = AnnoTier([span])
+        doc.tiers['bytes'] = AnnoTier([AnnoSpan(4, 7, doc, metadata={'raw': b'two'})])
+        loaded = serialization.loads(serialization.dumps(doc))
+        loaded_span = loaded.tiers['words'].spans[0]
+        self.assertEqual(loaded_span.label, str('word'))
+        self.assertIs(type(loaded_span.label), str)
+        self.assertEqual(loaded_span.metadata, {str('key'): str('value')})
+        self.assertIs(type(list(loaded_span.metadata.keys())[0]), str)
+        self.assertEqual(loaded.tiers['bytes'].spans[0].metadata['raw'], b'two')
+
+    def test_nested_groups(self):
+        doc = AnnoDoc('one two three')
+        words = doc.create_regex_tier(r'\w+')
+        doc.tiers['words'] = words
+        doc.tiers['tokens'] = words
+        doc.tiers['pairs'] = words.with_following_spans_from(words)
+        serialization.dump(doc, self.path)
+        loaded = serialization.load(self.path)
+        pair = loaded.tiers['pairs'].spans[0]
+        self.assertEqual(pair.text, 'one two')
+        self.assertIs(pair.base_spans[0], loaded.tiers['words'].spans[0])
+        self.assertIs(loaded.tiers['tokens'], loaded.tiers['words'])
+
+    def test_values(self):
+        doc = AnnoDoc('one two')
+        offset = datetime.timedelta(hours=-5)
+        values = {
+            'date': datetime.date(2017, 5, 12),
+            'datetime': datetime.datetime(2017, 5, 12, 1, 2, 3, 4),
+            'offset': offset,
+            'lists': collections.defaultdict(list, {'a': [1]}),
+        }
+        doc.tiers['words'] = AnnoTier([AnnoSpan(0, 3, doc, metadata=values)])
+        loaded = serialization.loads(serialization.dumps(doc))
+        self.assertEqual(loaded.tiers['words'].spans[0].metadata, values)
+        lists = loaded.tiers['words'].spans[0].metadata['lists']
+        self.assertIs(lists.default_factory, list)
+
+    def test_unregistered_class(self):
+        doc = AnnoDoc('one two')
+        doc.tiers['words'] = AnnoTier([UnregisteredSpan(0, 3, doc)])
+        with self.assertRaises(TypeError):
+            serialization.dumps(doc)
+        data = serialization.dumps(doc, allow_pickle=True)
+        with self.assertRaises(ValueError):
+            serialization.loads(data).tiers['words'].spans
+        loaded = serialization.loads(data, allow_pickle=True)
+        self.assertIsInstance(loaded.tiers['words'].spans[0], UnregisteredSpan)
+
+    def test_pickled_values(self):
+        doc = AnnoDoc('one two')
+        doc.tiers['words'] = AnnoTier([
+            AnnoSpan(0, 3, doc, metadata={'value': decimal.Decimal('1.5')})])
+        with self.assertRaises(TypeError):
+            serialization.dumps(doc)
+        data = serialization.dumps(doc, allow_pickle=True)
+        with self.assertRaises(ValueError):
+            serialization.loads(data).tiers['words'].spans[0].metadata
+        loaded = serialization.loads(data, allow_pickle=True)
+        self.assertEqual(
+            loaded.tiers['words'].spans[0].metadata['value'], decimal.Decimal('1.5'))
+
+
+if __name__ == '__main__':
+    unittest.main()
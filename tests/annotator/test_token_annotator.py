@@ -5,6 +5,7 @@ from __future__ import absolute_import
 import unittest
 from epitator.annotator import AnnoDoc
 from epitator.token_annotator import TokenAnnotator
+from epitator.spacy_annotator import get_token_index
 
 
 class TokenAnnotatorTest(unittest.TestCase):
@@ -73,6 +74,24 @@ class TokenAnnotatorTest(unittest.TestCase):
         self.assertEqual(self.doc.tiers['tokens'].spans[3].start, 29)
         self.assertEqual(self.doc.tiers['tokens'].spans[3].end, 30)
 
+    def test_token_index(self):
+        self.doc = AnnoDoc("The cases rose to 10 and the Case count to 12.")
+        self.annotator.annotate(self.doc)
+        tokens = self.doc.tiers['tokens']
+        token_index = get_token_index(tokens)
+        self.assertIs(token_index, get_token_index(tokens))
+        self.assertEqual(
+            [span.start for span in token_index.spans_with('lower', ['to', 'case'])],
+            [15, 29, 40])
+        self.assertEqual(
+            [(group.label, group.base_spans[0]) for group in token_index.search('lower', ['and'], 'joiner')],
+            [(span.label, span.base_spans[0]) for span in tokens.search_spans('and', 'joiner')])
+        # The index is recreated when the tier's spans are replaced.
+        tokens.spans = tokens.spans[:3]
+        self.assertEqual(
+            [span.start for span in get_token_index(tokens).spans_with('lower', ['to', 'case'])],
+            [])
+
 
 if __name__ == '__main__':
     unittest.main()